@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+from typing import Any, Optional, Tuple
+from MongoDB.data_retrieve import get_client
+
+class MongoStore:
+    """
+    TTLCache backing store kept in a Mongo collection.
+
+    Entries carry an `expiresAt` date with a TTL index on it, so Mongo deletes
+    them on its own once they expire.
+    """
+
+    def __init__(self, collection: str, db: str = "groupTrips"):
+        self.db = db
+        self.collection = collection
+        self._coll = None
+
+    def _collection(self):
+        if self._coll is None:
+            coll = get_client()[self.db][self.collection]
+            coll.create_index("expiresAt", expireAfterSeconds=0)
+            self._coll = coll
+        return self._coll
+
+    def load(self, key: str) -> Optional[Tuple[Any, float]]:
+        doc = self._collection().find_one({"_id": key})
+        if doc is None:
+            return None
+        return doc["value"], doc["expiresAt"].replace(tzinfo=timezone.utc).timestamp()
+
+    def save(self, key: str, value: Any, expires_at: float):
+        self._collection().replace_one(
+            {"_id": key},
+            {
+                "_id": key,
+                "value": value,
+                "createdAt": datetime.now(timezone.utc),
+                "expiresAt": datetime.fromtimestamp(expires_at, timezone.utc),
+            },
+            upsert=True,
+        )
+
+    def delete(self, key: str):
+        self._collection().delete_one({"_id": key})
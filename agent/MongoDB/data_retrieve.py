@@ -1,24 +1,179 @@
 from pymongo import MongoClient, DESCENDING
+from pymongo.errors import OperationFailure, PyMongoError
+from bson import ObjectId
+from bson.errors import InvalidId
 import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
 from dotenv import load_dotenv
 
-def get_data():
-    load_dotenv()
-    client = MongoClient(os.getenv("MONGO_URI"))
-    collection = client["groupTrips"]["groupTrips"]
+load_dotenv()
 
-    latest = collection.find_one({}, sort=[("createdAt", DESCENDING)])
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_POOL_SIZE = int(os.getenv("MONGO_POOL_SIZE", "20"))
+
+# only the fields the planner reads
+TRIP_PROJECTION = {
+    "createdAt": 1,
+    "status": 1,
+    "users.from": 1,
+    "users.budget.max": 1,
+    "users.dates": 1,
+    "users.interests": 1,
+}
+
+# trips without a status (or explicitly "pending") have not been planned yet
+PENDING_FILTER = {"status": {"$in": [None, "pending"]}}
+
+class InvalidTrip(ValueError):
+    """A groupTrips document the planner cannot read."""
+
+_client: Optional[MongoClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> MongoClient:
+    """Process-wide MongoClient (one connection pool), created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = MongoClient(MONGO_URI, maxPoolSize=MONGO_POOL_SIZE)
+                trips = client["groupTrips"]["groupTrips"]
+                trips.create_index([("createdAt", DESCENDING)])
+                trips.create_index([("status", 1), ("createdAt", DESCENDING)])
+                _client = client
+    return _client
+
+def get_collection():
+    return get_client()["groupTrips"]["groupTrips"]
+
+def trip_object_id(trip_id: str) -> ObjectId:
+    try:
+        return ObjectId(trip_id)
+    except (InvalidId, TypeError):
+        raise ValueError(f"{trip_id!r} is not a valid trip id") from None
+
+def _to_request(trip: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return _read_trip(trip)
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise InvalidTrip(f"Trip {trip.get('_id')} is malformed: {e!r}") from e
+
+def _read_trip(trip: Dict[str, Any]) -> Dict[str, Any]:
     res = {}
+    res["trip_id"] = str(trip["_id"])
     res["group_profiles"] = []
     res["departures"] = []
     
-    for user in range(len(latest['users'])):
-        res["departures"].append({"airport": latest['users'][user]['from'], "budget": int(latest['users'][user]['budget']['max'])})
-        res["start_date"] = latest['users'][user]['dates']['start']
-        res["end_date"] = latest['users'][user]['dates']['end']    
-        res["group_profiles"].append({"interests": latest['users'][user]['interests']})
-    print(res)
+    for user in range(len(trip['users'])):
+        res["departures"].append({"airport": trip['users'][user]['from'], "budget": int(trip['users'][user]['budget']['max'])})
+        res["start_date"] = trip['users'][user]['dates']['start']
+        res["end_date"] = trip['users'][user]['dates']['end']    
+        res["group_profiles"].append({"interests": trip['users'][user]['interests']})
     return res
+
+def get_data(trip_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load a trip request for the planner.
+
+    Args:
+        trip_id: id of the groupTrips document; the newest trip when omitted
+
+    Raises:
+        ValueError: `trip_id` is not an ObjectId
+        LookupError: no such trip
+        InvalidTrip: the document lacks fields the planner needs
+    """
+    collection = get_collection()
+    if trip_id:
+        trip = collection.find_one({"_id": trip_object_id(trip_id)}, TRIP_PROJECTION)
+    else:
+        trip = collection.find_one({}, TRIP_PROJECTION, sort=[("createdAt", DESCENDING)])
+    if trip is None:
+        raise LookupError(f"No trip found{f' with id {trip_id}' if trip_id else ''}")
+
+    return _to_request(trip)
+
+def get_trips(trip_ids: List[str]) -> Dict[str, Any]:
+    """
+    Load several trip requests with one query.
+
+    Returns a dict with an entry for each distinct id in `trip_ids`, in order:
+    the planner request, or the exception get_data would have raised for it
+    (ValueError, LookupError or InvalidTrip).
+    """
+    results: Dict[str, Any] = {}
+    # several spellings of an id (e.g. upper-case hex) name the same document
+    ids: Dict[ObjectId, List[str]] = {}
+    for trip_id in dict.fromkeys(trip_ids):
+        try:
+            ids.setdefault(trip_object_id(trip_id), []).append(trip_id)
+            results[trip_id] = LookupError(f"No trip found with id {trip_id}")
+        except ValueError as e:
+            results[trip_id] = e
+    if ids:
+        for trip in get_collection().find({"_id": {"$in": list(ids)}}, TRIP_PROJECTION):
+            try:
+                request = _to_request(trip)
+            except InvalidTrip as e:
+                request = e
+            for trip_id in ids.get(trip["_id"], ()):
+                results[trip_id] = request
+    return results
+
+def get_pending_trips(limit: int = 50, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Load up to `limit` not-yet-planned trip requests, newest first, optionally only those created since `since`."""
+    query = dict(PENDING_FILTER, createdAt={"$gte": since}) if since is not None else PENDING_FILTER
+    cursor = get_collection().find(query, TRIP_PROJECTION).sort("createdAt", DESCENDING).limit(limit)
+    requests = []
+    for trip in cursor:
+        try:
+            requests.append(_to_request(trip))
+        except InvalidTrip as e:
+            # flagged, so it is not read again on every poll
+            print(f"Skipping pending trip: {e}")
+            set_trip_status(str(trip["_id"]), "failed")
+    return requests
+
+def claim_trip(trip_id: str, status: str = "planning") -> bool:
+    """Move a pending trip to `status`; False if another planner already took it."""
+    result = get_collection().update_one(
+        dict(PENDING_FILTER, _id=ObjectId(trip_id)), {"$set": {"status": status}}
+    )
+    return result.modified_count == 1
+
+def set_trip_status(trip_id: str, status: str):
+    get_collection().update_one({"_id": ObjectId(trip_id)}, {"$set": {"status": status}})
+
+def watch_new_trips() -> Iterator[Dict[str, Any]]:
+    """
+    Yield a trip request for every document inserted into groupTrips from now on.
+
+    Change streams need a replica set (or Atlas): on a standalone server this
+    raises OperationFailure. Other interruptions are resumed from the last
+    change seen.
+    """
+    pipeline = [{"$match": {"operationType": "insert"}}]
+    token = None
+    while True:
+        try:
+            with get_collection().watch(pipeline, resume_after=token) as stream:
+                for change in stream:
+                    token = stream.resume_token
+                    try:
+                        request = _to_request(change["fullDocument"])
+                    except InvalidTrip as e:
+                        print(f"Skipping new trip: {e}")
+                        set_trip_status(str(change["fullDocument"]["_id"]), "failed")
+                        continue
+                    yield request
+        except OperationFailure:
+            raise
+        except PyMongoError as e:
+            print(f"Change stream interrupted, resuming: {e}")
+            time.sleep(1)
     
 if __name__ == "__main__":
-    get_data()
\ No newline at end of file
+    print(get_data())
\ No newline at end of file
@@ -0,0 +1,118 @@
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, ReturnDocument
+from MongoDB.data_retrieve import get_client
+
+# a running job whose worker has not checked in for this long is handed to another worker
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))
+# finished jobs are deleted after this long
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+_coll = None
+
+def get_jobs():
+    """groupTrips.planJobs, with its indexes created on first use."""
+    global _coll
+    if _coll is None:
+        coll = get_client()["groupTrips"]["planJobs"]
+        coll.create_index([("status", ASCENDING), ("createdAt", ASCENDING)])
+        coll.create_index("expiresAt", expireAfterSeconds=0)
+        _coll = coll
+    return _coll
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def enqueue(request: Dict[str, Any], refresh: bool = False) -> str:
+    """
+    Queue a planning job and return its id.
+
+    Args:
+        request: the trip request with dates as YYYY-MM-DD strings
+        refresh: skip the plan cache when the job runs
+    """
+    now = _now()
+    result = get_jobs().insert_one({
+        "status": "queued",
+        "request": request,
+        "refresh": refresh,
+        "attempts": 0,
+        "events": [],
+        "result": None,
+        "error": None,
+        "createdAt": now,
+        "updatedAt": now,
+    })
+    return str(result.inserted_id)
+
+def claim(worker: str) -> Optional[Dict[str, Any]]:
+    """Atomically take the oldest queued job, or None if the queue is empty."""
+    now = _now()
+    return get_jobs().find_one_and_update(
+        {"status": "queued"},
+        {
+            "$set": {"status": "running", "worker": worker, "startedAt": now, "updatedAt": now},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("createdAt", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+def add_event(job_id: ObjectId, event: Dict[str, Any]):
+    """Persist one pipeline stage result; also serves as the worker's heartbeat."""
+    get_jobs().update_one(
+        {"_id": job_id},
+        {"$push": {"events": event}, "$set": {"updatedAt": _now()}},
+    )
+
+def finish(job_id: ObjectId, result: Dict[str, Any]):
+    now = _now()
+    get_jobs().update_one({"_id": job_id}, {"$set": {
+        "status": "done",
+        "result": result,
+        "updatedAt": now,
+        "expiresAt": now + timedelta(seconds=JOB_RETENTION_SECONDS),
+    }})
+
+def fail(job_id: ObjectId, error: str):
+    now = _now()
+    get_jobs().update_one({"_id": job_id}, {"$set": {
+        "status": "failed",
+        "error": error,
+        "updatedAt": now,
+        "expiresAt": now + timedelta(seconds=JOB_RETENTION_SECONDS),
+    }})
+
+def requeue_stale(stale_seconds: float = JOB_STALE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+    """Return jobs abandoned by a dead worker to the queue (or fail them after max_attempts)."""
+    jobs = get_jobs()
+    cutoff = _now() - timedelta(seconds=stale_seconds)
+    stale = {"status": "running", "updatedAt": {"$lt": cutoff}}
+    now = _now()
+    jobs.update_many(
+        dict(stale, attempts={"$gte": max_attempts}),
+        {"$set": {
+            "status": "failed",
+            "error": "worker lost",
+            "updatedAt": now,
+            "expiresAt": now + timedelta(seconds=JOB_RETENTION_SECONDS),
+        }},
+    )
+    return jobs.update_many(
+        stale,
+        {"$set": {"status": "queued", "events": [], "updatedAt": now}},
+    ).modified_count
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        return get_jobs().find_one({"_id": ObjectId(job_id)})
+    except InvalidId:
+        return None
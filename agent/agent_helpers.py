@@ -1,103 +1,384 @@
 import os
 os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
 import asyncio
+import importlib
+import json
+import sys
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional
 from agents import Agent, Runner
-from agents.mcp import MCPServerSse       
+from agents.mcp import MCPServer, MCPServerSse, MCPServerStdio
 from agents.model_settings import ModelSettings
-from agents import set_default_openai_key
+from agents import set_default_openai_client
 from dotenv import load_dotenv
+from mcp.types import CallToolResult, TextContent
+from scheduler import OPENAI, PRIORITY, UpstreamTransport
+from prompts import PLAN_INSTRUCTIONS, openai_client, prompt_kind
+from metrics import span
 
 load_dotenv()               
-set_default_openai_key(os.environ["OPENAI_API_KEY"])
+# one metered client for every agent run, so cached input tokens are recorded; each
+# model request the runner makes is admitted (and 429-retried) by OPENAI on its own
+set_default_openai_client(
+    openai_client(os.environ["OPENAI_API_KEY"], transport=UpstreamTransport(OPENAI)), use_for_tracing=False
+)
 
 MODEL_NAME = "gpt-4.1-2025-04-14" 
+# how agent runs reach the tools: "sse" (server.py running separately), "stdio"
+# (persistent server.py child per pooled session) or "inprocess" (no server at all)
+MCP_TRANSPORT = os.environ.get("MCP_TRANSPORT", "sse").lower()
+MCP_SSE_URL = os.environ.get("MCP_SSE_URL", "http://localhost:8000/sse")
+MCP_SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp", "server.py")
+MCP_POOL_SIZE = int(os.environ.get("MCP_POOL_SIZE", "4"))
+# direct tool calls (fare pre-pass, accommodation prefetch and lookups) in flight at once,
+# on a session of their own so they never queue behind long agent runs
+MCP_TOOL_CONCURRENCY = int(os.environ.get("MCP_TOOL_CONCURRENCY", "16"))
+MCP_HEALTH_CHECK_SECONDS = float(os.environ.get("MCP_HEALTH_CHECK_SECONDS", "30"))
 
-async def ask_agent(message: str) -> str:
-    async with MCPServerSse(
-        name="Python SSE Server",
-        params={"url": "http://localhost:8000/sse"},
-        client_session_timeout_seconds=30,
-    ) as mcp_server:
+
+def _load_tools():
+    # server.py imports its siblings (live_prices, itineraries) as top-level modules
+    mcp_dir = os.path.dirname(MCP_SERVER_PATH)
+    if mcp_dir not in sys.path:
+        sys.path.append(mcp_dir)
+    return importlib.import_module("server").mcp
+
+
+class InProcessMCPServer(MCPServer):
+    """
+    The tools of mcp/server.py, called directly in this process.
+
+    Tool calls skip the server process, the HTTP hop and the JSON-RPC framing
+    and go straight to FastMCP's dispatch; the quote cache and in-flight
+    search coalescing are then shared with everything else in the process.
+    """
+
+    def __init__(self, name: str = "In-process MCP Server"):
+        self._name = name
+        # the mounted FastMCP app, standing in for the client session once connected
+        self.session = None
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def connect(self):
+        if self.session is None:
+            # first import reads .env and opens the quote cache; keep it off the loop
+            self.session = await asyncio.to_thread(_load_tools)
+
+    async def cleanup(self):
+        # the module and its caches live on for the next session
+        self.session = None
+
+    async def list_tools(self):
+        return await self.session.list_tools()
+
+    async def call_tool(self, tool_name, arguments):
+        try:
+            content = await self.session.call_tool(tool_name, arguments or {})
+        except Exception as e:
+            # the same result the SSE server sends back for a failing tool
+            return CallToolResult(content=[TextContent(type="text", text=str(e))], isError=True)
+        return CallToolResult(content=list(content), isError=False)
+
+
+class _PooledTools:
+    """Tool listing shared by every session in the pool, and a span around each tool call."""
+
+    def __init__(self, pool: "MCPSessionPool", **kw):
+        super().__init__(**kw)
+        self._pool = pool
+
+    async def list_tools(self):
+        if self._pool.tools is None:
+            self._pool.tools = await super().list_tools()
+        return self._pool.tools
+
+    async def call_tool(self, tool_name, arguments):
+        # both agent tool calls and call_mcp_tool come through here
+        with span("mcp_tool", tool=tool_name):
+            return await super().call_tool(tool_name, arguments)
+
+
+class _PooledSseServer(_PooledTools, MCPServerSse):
+    pass
+
+
+class _PooledStdioServer(_PooledTools, MCPServerStdio):
+    pass
+
+
+class _PooledInProcessServer(_PooledTools, InProcessMCPServer):
+    pass
+
+
+@dataclass
+class _PooledSession:
+    server: MCPServer
+    agent: Agent
+    owner: asyncio.Task
+    closing: asyncio.Event
+    last_checked: float = field(default_factory=time.monotonic)
+
+    @property
+    def alive(self) -> bool:
+        return not self.owner.done() and self.server.session is not None
+
+
+class MCPSessionPool:
+    """
+    Process-wide pool of connected MCP sessions over `transport`.
+
+    At most `size` sessions are checked out at once. Idle sessions are pinged
+    before reuse once they have been idle longer than `health_check_seconds`,
+    and dead or failed sessions are dropped and reconnected on demand.
+
+    Each session is opened and closed inside its own owner task, because the
+    SSE transport's task group must be exited by the task that entered it.
+    Sessions are bound to the event loop that opened them; if the pool is used
+    from a different loop, the old sessions are forgotten.
+    """
+
+    def __init__(self, url: str = MCP_SSE_URL, size: int = MCP_POOL_SIZE,
+                 health_check_seconds: float = MCP_HEALTH_CHECK_SECONDS, transport: str = MCP_TRANSPORT):
+        if transport not in ("sse", "stdio", "inprocess"):
+            raise ValueError(f"Unknown MCP transport {transport!r}")
+        self.url = url
+        self.transport = transport
+        self.size = size
+        self.health_check_seconds = health_check_seconds
+        self.tools = None
+        self._idle: list[_PooledSession] = []
+        self._slots: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.size)
+            self._idle = []
+
+    def _server(self) -> MCPServer:
+        if self.transport == "inprocess":
+            return _PooledInProcessServer(self)
+        if self.transport == "stdio":
+            # the child gets the full environment (API keys), not the SDK's minimal default
+            return _PooledStdioServer(
+                self,
+                name="Python stdio Server",
+                params={
+                    "command": sys.executable,
+                    "args": [MCP_SERVER_PATH, "--transport", "stdio"],
+                    "env": dict(os.environ),
+                },
+                cache_tools_list=True,
+                client_session_timeout_seconds=30,
+            )
+        return _PooledSseServer(
+            self,
+            name="Python SSE Server",
+            params={"url": self.url},
+            cache_tools_list=True,
+            client_session_timeout_seconds=30,
+        )
+
+    async def _open(self) -> _PooledSession:
+        ready = asyncio.get_running_loop().create_future()
+        closing = asyncio.Event()
+        server = self._server()
+
+        async def _own():
+            try:
+                await server.connect()
+            except BaseException as e:
+                if not ready.done():
+                    ready.set_exception(e)
+                return
+            try:
+                if ready.done():
+                    # the caller was cancelled while we connected; nobody will use this session
+                    return
+                ready.set_result(None)
+                await closing.wait()
+            finally:
+                await server.cleanup()
+
+        owner = asyncio.create_task(_own())
+        try:
+            await ready
+        except asyncio.CancelledError:
+            # let the owner finish connecting (or failing) and close the session it opened
+            closing.set()
+            await asyncio.gather(owner, return_exceptions=True)
+            raise
 
         agent = Agent(
             model=MODEL_NAME,
             name="Assistant",
-            instructions="Use the tools to help planning out user's trip",
-            mcp_servers=[mcp_server],
+            instructions=PLAN_INSTRUCTIONS,
+            mcp_servers=[server],
             model_settings=ModelSettings(tool_choice="required"),
         )
+        return _PooledSession(server=server, agent=agent, owner=owner, closing=closing)
+
+    async def _healthy(self, s: _PooledSession) -> bool:
+        if not s.alive:
+            return False
+        if self.transport == "inprocess" or time.monotonic() - s.last_checked < self.health_check_seconds:
+            return True
+        try:
+            await asyncio.wait_for(s.server.session.send_ping(), timeout=5)
+        except Exception:
+            return False
+        s.last_checked = time.monotonic()
+        return True
+
+    async def _acquire(self) -> _PooledSession:
+        while self._idle:
+            s = self._idle.pop()
+            if await self._healthy(s):
+                return s
+            s.closing.set()
+        return await self._open()
+
+    @asynccontextmanager
+    async def session(self):
+        """Check out a connected session, reconnecting if none is healthy."""
+        self._bind_loop()
+        async with self._slots:
+            s = await self._acquire()
+            try:
+                yield s
+            except BaseException:
+                # the transport may be in an unknown state; reconnect next time
+                s.closing.set()
+                raise
+            else:
+                s.last_checked = time.monotonic()
+                self._idle.append(s)
+
+    async def close(self):
+        """Close every idle session."""
+        idle, self._idle = self._idle, []
+        for s in idle:
+            s.closing.set()
+        await asyncio.gather(*(s.owner for s in idle), return_exceptions=True)
+
+
+
+class SharedMCPSession:
+    """
+    One MCP session shared by concurrent direct tool calls.
+
+    A direct call is a single request/response, which the client session
+    multiplexes, so unlike an agent run it needs no session to itself; at most
+    `max_calls` are in flight. The session is opened through a one-session
+    MCPSessionPool, reopened when it dies, and pinged after a failed call so a
+    broken transport is replaced rather than reused.
+    """
+
+    def __init__(self, transport: str = MCP_TRANSPORT, max_calls: int = MCP_TOOL_CONCURRENCY):
+        self._pool = MCPSessionPool(size=1, transport=transport)
+        self.max_calls = max_calls
+        self._current: _PooledSession | None = None
+        self._opening: asyncio.Future | None = None
+        self._calls: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def transport(self) -> str:
+        return self._pool.transport
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._calls = asyncio.Semaphore(self.max_calls)
+            self._current = None
+            self._opening = None
+
+    async def _get(self) -> _PooledSession:
+        if self._current is not None and self._current.alive:
+            return self._current
+        if self._opening is None:
+            # concurrent callers wait on the same connect
+            self._opening = asyncio.ensure_future(self._pool._open())
+        opening = self._opening
+        try:
+            self._current = await asyncio.shield(opening)
+        finally:
+            if opening.done() and self._opening is opening:
+                self._opening = None
+        return self._current
+
+    async def _drop_if_broken(self, s: _PooledSession):
+        try:
+            await asyncio.wait_for(s.server.session.send_ping(), timeout=5)
+        except Exception:
+            if self._current is s:
+                self._current = None
+            s.closing.set()
+
+    @asynccontextmanager
+    async def session(self):
+        """The shared session, once a call slot is free."""
+        self._bind_loop()
+        async with self._calls:
+            s = await self._get()
+            try:
+                yield s
+            except Exception:
+                await self._drop_if_broken(s)
+                raise
+
+    async def close(self):
+        s, self._current = self._current, None
+        if s is not None:
+            s.closing.set()
+            await asyncio.gather(s.owner, return_exceptions=True)
+
+
+MCP_POOL = MCPSessionPool()
+MCP_TOOLS = SharedMCPSession()
+# this process's own copy of the tools, for stateful calls under stdio
+_LOCAL_TOOLS = InProcessMCPServer()
+
+async def ask_agent(message: str, priority: Optional[int] = None) -> str:
+    # the pool bounds the runs in flight; OPENAI admits their model requests one by one
+    token = PRIORITY.set(priority) if priority is not None else None
+    try:
+        with prompt_kind("plan"):
+            async with MCP_POOL.session() as s:
+                result = await Runner.run(starting_agent=s.agent, input=message)
+                return result.final_output
+    finally:
+        if token is not None:
+            PRIORITY.reset(token)
+
+async def call_mcp_tool(name: str, arguments: dict, stateful: bool = False):
+    """
+    Call an MCP tool directly (no model in the loop) and return its decoded JSON result.
+
+    `stateful` tools keep state between calls (e.g. background searches started
+    by one call and read by the next). Under stdio every pooled session is a
+    separate child with its own state, so those calls run in this process.
+    """
+    if stateful and MCP_TOOLS.transport == "stdio":
+        await _LOCAL_TOOLS.connect()
+        with span("mcp_tool", tool=name):
+            result = await _LOCAL_TOOLS.call_tool(name, arguments)
+    else:
+        async with MCP_TOOLS.session() as s:
+            result = await s.server.call_tool(name, arguments)
+    text = "".join(c.text for c in result.content if getattr(c, "text", None))
+    if result.isError:
+        raise RuntimeError(f"MCP tool {name} failed: {text}")
+    return json.loads(text) if text else None
 
-        result = await Runner.run(starting_agent=agent, input=message)
-        return result.final_output
-
-PROMPT_TEMPLATE = """\
-You are a travel-planning agent.
-
-Return ONLY a valid JSON object that matches *exactly* this schema
-(no markdown, no stray text before or after):
-
-{{
-  "destination": {{
-    "city": "{destination_city}",
-    "country": "<country name>",
-    "summary": "<30-60-word engaging overview of the destination>",
-    "top_highlights": [
-      "<main highlight 1>",
-      "<main highlight 2>",
-      "<main highlight 3>"
-    ]
-  }},
-  "flights": {{
-    "total_price": <number>,
-    "airline": "<carrier name>",
-    "outbound": {{
-      "date": "<YYYY-MM-DD>",
-      "time": "<HH:MM>",
-      "flight_no": "<code>",
-      "from": "<IATA>",
-      "to": "<IATA>",
-      "price": <number>,
-      "booking_link": "<https://…>"
-    }},
-    "return": {{
-      "date": "<YYYY-MM-DD>",
-      "time": "<HH:MM>",
-      "flight_no": "<code>",
-      "from": "<IATA>",
-      "to": "<IATA>",
-      "price": <number>,
-      "booking_link": "<https://…>"
-    }}
-  }},
-  "accommodations": [
-    {{
-      "name": "<hotel | airbnb>",
-      "platform": "<Booking.com | Airbnb | …>",
-      "total_price": <number>,
-      "price_per_night": <number>,
-      "location": "<neighbourhood>",
-      "why": "<one-sentence reason>",
-      "booking_link": "<https://…>"
-    }}
-    // up to 3 options
-  ],
-  "grand_totals": [
-    {{ "option_index": 0, "total_trip_cost": <number> }},
-    {{ "option_index": 1, "total_trip_cost": <number> }},
-    {{ "option_index": 2, "total_trip_cost": <number> }}
-  ]
-}}
-
-Fill every required field; omit none. Use the budget and dates below:
-
-• Departure airport: {departure_airport}
-• Destination city: {destination_city}
-• Start date: {start_date:%Y-%m-%d}
-• End date:   {end_date:%Y-%m-%d}
-• Budget:     {budget}
-
-Do NOT wrap the JSON in back-ticks or add commentary.
-"""
-
-def build_prompt(data: dict) -> str:
-    return PROMPT_TEMPLATE.format(**data)
\ No newline at end of file
+async def close_pools():
+    """Close the agent pool's idle sessions and the direct tool calls' session."""
+    await asyncio.gather(MCP_POOL.close(), MCP_TOOLS.close())
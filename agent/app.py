@@ -1,138 +1,137 @@
-import asyncio, json
+import json
+import atexit
 import traceback
+from contextlib import closing
 from datetime import date
-from flask import Flask, request, jsonify
-from shortlister import ShortlisterSync
-from agent_helpers import ask_agent
-from MongoDB.data_retrieve import get_data
+from flask import Flask, Response, request, jsonify
+import event_loop
+from agent_helpers import close_pools
+from MongoDB.data_retrieve import InvalidTrip, get_data
+from MongoDB import job_queue
+from batch import plan_trip_ids
+from planner import scl, PLAN_CACHE, DESTINATIONS, validate_basics, plan_trip as run_plan, cached_plan_events, assemble
+from scheduler import OPENAI
+from prompts import TOKENS
+import metrics
+from metrics import span
 from flask_cors import CORS
 
 app = Flask(__name__)
 CORS(app, origins='http://localhost:5173')
-scl = ShortlisterSync()
-
-def _parse_iso(d: str) -> date:
-    return date.fromisoformat(d)
-
-def _validate_basics(js: dict) -> dict:
-    # top-level required fields
-    if "departures" not in js or "group_profiles" not in js \
-       or "start_date" not in js or "end_date" not in js:
-        raise KeyError("Must include: departures, group_profiles, start_date, end_date")
-
-    # parse dates
-    sd = _parse_iso(js["start_date"])
-    ed = _parse_iso(js["end_date"])
-    if ed <= sd:
-        raise ValueError("'end_date' must be after 'start_date'")
-    js["start_date"], js["end_date"] = sd, ed
-
-    # each departure needs an airport code and budget
-    for leg in js["departures"]:
-        if "airport" not in leg or "budget" not in leg:
-            raise KeyError("Each departure must have 'airport' and 'budget'")
-    return js
-
-
-PROMPT_TEMPLATE = """\
-You are a travel-planning agent.
-
-Return ONLY a JSON object exactly matching this schema (no markdown):
-
-{{
-  "destination": {{
-    "city": {city},
-    "country": "<country>",
-    "summary": "<30-60 word engaging overview>",
-    "top_highlights": ["<h1>", "<h2>", "<h3>"]
-  }},
-  "flights": [
-    {{
-      "departure_airport": "<IATA>",
-      "airline": "<carrier>",
-      "flight_no": "<code>",
-      "outbound": {{
-        "date": "<YYYY-MM-DD>",
-        "time": "<HH:MM>",
-        "price": <number>,
-        "booking_link": "<https://…>"
-      }},
-      "return": {{
-        "date": "<YYYY-MM-DD>",
-        "time": "<HH:MM>",
-        "price": <number>,
-        "booking_link": "<https://…>"
-      }}
-    }}
-  ],
-  "totals": {{
-    "total_flight_cost": <number>
-  }}
-}}
-
-Use these inputs verbatim:
-
-• Candidate city: {city}
-• Travel dates: {start_date:%Y-%m-%d} → {end_date:%Y-%m-%d}
-• For each departure, note its airport and its individual budget.
-• Group interests: {interests_list}
-
-Ensure:
-- No fields are omitted.
-- Each flight’s return leg comes back to the same origin airport.
-- Sum of all flight prices in `totals.total_flight_cost`.
-- Stay within each origin’s budget.
-
-Do NOT wrap in back-ticks or add any extra commentary.
-"""
-
-
-def _build_prompt(common: dict, city: str) -> str:
-    # format departures as bullet list
-    deps = "\n".join(
-        f"- {leg['airport']}: budget ${leg['budget']}"
-        for leg in common["departures"]
-    )
-    # flatten interests
-    interests = ", ".join(
-        interest 
-        for profile in common["group_profiles"] 
-        for interest in profile["interests"]
-    )
-    return PROMPT_TEMPLATE.format(
-        city=city,
-        start_date=common["start_date"],
-        end_date=common["end_date"],
-        interests_list=interests,
-    ) + "\n\nDepartures:\n" + deps
-
-async def _plan_for_all(common, candidates):
-    tasks = []
-    for c in candidates:
-        prompt = _build_prompt(common, c["city"])
-        tasks.append(ask_agent(prompt))
-    raw = await asyncio.gather(*tasks)
-    out = []
-    for txt in raw:
+
+def _stream_response(data, fmt: str, refresh: bool = False) -> Response:
+    def lines():
         try:
-            out.append(json.loads(txt))
-        except json.JSONDecodeError as e:
-            out.append({"raw": txt, "error": str(e)})
-    return out
+            with closing(event_loop.iterate(cached_plan_events(data, refresh))) as events:
+                for ev in events:
+                    yield _format_event(ev, fmt)
+            yield _format_event({"event": "done"}, fmt)
+        except Exception as exc:
+            traceback.print_exc()
+            yield _format_event({"event": "error", "error": str(exc)}, fmt)
+
+    mimetype = "text/event-stream" if fmt == "sse" else "application/x-ndjson"
+    return Response(lines(), mimetype=mimetype, headers={"Cache-Control": "no-cache"})
+
+def _format_event(ev: dict, fmt: str) -> str:
+    body = json.dumps(ev, separators=(',', ':'))
+    if fmt == "sse":
+        return f"event: {ev['event']}\ndata: {body}\n\n"
+    return body + "\n"
 
 @app.post("/plan-trip")
 def plan_trip():
     try:
-        payload = get_data()
-        data = _validate_basics(payload)
-        shortlist = scl.get_shortlist(data["group_profiles"])
-        candidates = shortlist["candidates"]
-        plans = asyncio.run(_plan_for_all(data, candidates))
-        return jsonify({ "plans": plans, "shortlist": candidates }), 200
+        try:
+            with span("mongo_read"):
+                payload = get_data(request.args.get("trip_id"))
+        except InvalidTrip as exc:
+            return jsonify(error=str(exc)), 422
+        except ValueError as exc:
+            return jsonify(error=str(exc)), 400
+        except LookupError as exc:
+            return jsonify(error=str(exc)), 404
+        # ?flex_days=N searches ±N days around the requested dates
+        if request.args.get("flex_days"):
+            payload["flex_days"] = request.args["flex_days"]
+        data = validate_basics(payload)
+
+        # ?stream=ndjson (or 1) / ?stream=sse: send the shortlist, then each plan as it finishes
+        # ?async=1: queue the job for worker.py and poll GET /jobs/<job_id>
+        # ?refresh=1 skips the plan cache and recomputes
+        refresh = request.args.get("refresh", "").lower() in ("1", "true")
+        if request.args.get("async", "").lower() in ("1", "true"):
+            job_id = job_queue.enqueue(_to_job_request(data), refresh)
+            return jsonify(job_id=job_id, status="queued", status_url=f"/jobs/{job_id}"), 202
+
+        fmt = request.args.get("stream", "").lower()
+        if fmt in ("1", "true", "ndjson", "sse"):
+            return _stream_response(data, "sse" if fmt == "sse" else "ndjson", refresh)
+
+        # the whole pipeline runs on the shared loop; this thread only waits
+        with span("plan_trip"):
+            result = event_loop.run(run_plan(data, refresh))
+        return jsonify(result), 200
 
     except Exception as exc:
         traceback.print_exc() 
         return jsonify(error=str(exc)), 500
 
+@app.post("/plan-trips")
+def plan_trips():
+    """
+    Plan several groupTrips at once: body {"trip_ids": [...]}. Shortlists and
+    fare searches shared between the groups are looked up only once.
+    """
+    trip_ids = (request.get_json(silent=True) or {}).get("trip_ids")
+    if not isinstance(trip_ids, list) or not trip_ids or not all(isinstance(t, str) for t in trip_ids):
+        return jsonify(error="Body must include a non-empty 'trip_ids' list of strings"), 400
+    refresh = request.args.get("refresh", "").lower() in ("1", "true")
+    try:
+        with span("plan_batch"):
+            result = event_loop.run(plan_trip_ids(trip_ids, refresh))
+        return jsonify(result), 200
+    except Exception as exc:
+        traceback.print_exc()
+        return jsonify(error=str(exc)), 500
+
+def _to_job_request(data: dict) -> dict:
+    # Mongo stores datetimes, not dates; workers re-validate the ISO strings
+    return {k: v.isoformat() if isinstance(v, date) else v for k, v in data.items()}
+
+@app.get("/jobs/<job_id>")
+def job_status(job_id: str):
+    job = job_queue.get_job(job_id)
+    if job is None:
+        return jsonify(error=f"No job {job_id}"), 404
+    return jsonify({
+        "job_id": job_id,
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+        # the stages finished so far, in the same shape as the final result
+        "result": job["result"] or assemble(job["events"]),
+    }), 200
+
+@app.get("/cache-stats")
+def cache_stats():
+    return jsonify({"shortlist": scl.cache_stats(), "plans": PLAN_CACHE.stats(),
+                    "destinations": DESTINATIONS.stats(), "openai": OPENAI.stats(),
+                    "tokens": TOKENS.stats()}), 200
+
+metrics.collect("sweetspot_cache", "cache", lambda: {
+    "plans": PLAN_CACHE.stats(), "shortlist": scl.cache_stats(), "destinations": DESTINATIONS.stats(),
+})
+metrics.collect("sweetspot_upstream", "upstream", lambda: {"openai": OPENAI.stats()})
+metrics.collect("sweetspot_tokens", "kind", TOKENS.stats)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@atexit.register
+def _shutdown():
+    event_loop.run(close_pools(), timeout=10)
+
 if __name__ == "__main__":
-    app.run(port=7000, debug=True)
\ No newline at end of file
+    app.run(port=7000, debug=True, threaded=True)
\ No newline at end of file
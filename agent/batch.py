@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import json
+import os
+import traceback
+from datetime import date
+from typing import Any, Dict, Iterator, List, Tuple
+from MongoDB.data_retrieve import get_trips, get_pending_trips, claim_trip, set_trip_status
+from fares import FareMatrix, date_window, fetch_fare_matrix
+from shortlister import canonical_interests
+from plan_cache import plan_key
+from metrics import span
+import planner
+
+# distinct shortlist queries and fare searches in flight at once
+BATCH_LOOKUP_CONCURRENCY = int(os.environ.get("BATCH_LOOKUP_CONCURRENCY", "8"))
+# groups planned at once once the shared lookups are done
+BATCH_GROUP_CONCURRENCY = int(os.environ.get("BATCH_GROUP_CONCURRENCY", "4"))
+
+Leg = Tuple[str, str, date]
+
+def _legs(data: Dict[str, Any], candidates: List[Dict[str, Any]]) -> Iterator[Leg]:
+    # every (from, to, day) this group's fare pre-pass would search
+    for leg in data["departures"]:
+        origin = leg["airport"].strip().upper()
+        for candidate in candidates:
+            iata = candidate["iata"].strip().upper()
+            if origin == iata:
+                continue
+            for day in date_window(data["start_date"], data["flex_days"]):
+                yield origin, iata, day
+            for day in date_window(data["end_date"], data["flex_days"]):
+                yield iata, origin, day
+
+async def _shared_shortlists(requests: List[Dict[str, Any]], limit: asyncio.Semaphore) -> Dict[str, Dict[str, Any]]:
+    """One shortlist per distinct interest profile, keyed like the shortlist cache."""
+    profiles = {}
+    for data in requests:
+        profiles.setdefault(json.dumps(canonical_interests(data["group_profiles"]), separators=(',', ':')), data["group_profiles"])
+
+    async def _one(group_profiles):
+        async with limit:
+            return await planner.scl.get_shortlist(group_profiles)
+
+    with span("batch_shortlists"):
+        shortlists = await asyncio.gather(*(_one(p) for p in profiles.values()), return_exceptions=True)
+    return dict(zip(profiles, shortlists))
+
+async def _shared_fares(legs: List[Leg], limit: asyncio.Semaphore) -> Tuple[FareMatrix, int]:
+    """
+    Search every distinct leg once. Legs are batched per (from, day), so each
+    search_live_prices_batch call covers exactly the destinations some group
+    needs. Outbound and return legs share one matrix.
+    """
+    by_origin_day: Dict[Tuple[str, date], set] = {}
+    for origin, destination, day in legs:
+        by_origin_day.setdefault((origin, day), set()).add(destination)
+    matrix: FareMatrix = {}
+
+    async def _one(origin: str, day: date, destinations: set):
+        async with limit:
+            part = await fetch_fare_matrix([origin], sorted(destinations), [day], planner.FARE_TOP_K)
+        for o, row in part.items():
+            for d, days in row.items():
+                matrix.setdefault(o, {}).setdefault(d, {}).update(days)
+
+    with span("batch_fares"):
+        results = await asyncio.gather(
+            *(_one(origin, day, dests) for (origin, day), dests in by_origin_day.items()), return_exceptions=True
+        )
+    for (origin, day), result in zip(by_origin_day, results):
+        if isinstance(result, BaseException):
+            # those groups' optimizer/prefilter see no fares and the agents search themselves
+            print(f"Batch fare search {origin} {day} failed: {result!r}")
+    return matrix, len(by_origin_day)
+
+async def plan_batch(requests: List[Dict[str, Any]], refresh: bool = False,
+                     lookup_concurrency: int = BATCH_LOOKUP_CONCURRENCY,
+                     group_concurrency: int = BATCH_GROUP_CONCURRENCY) -> Dict[str, Any]:
+    """
+    Plan many validated trip requests, resolving what groups share only once.
+
+    Cached plans are served as they are (unless `refresh`). For the rest, one
+    shortlist is fetched per distinct interest profile and one fare search run
+    per distinct (from, to, day) leg across all groups; each group is then
+    planned from those, so the work grows with unique routes rather than with
+    the number of groups.
+
+    Returns:
+        {"results": {trip_id: result}, "errors": {trip_id: message}, "stats": {...}}
+    """
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    todo = []
+    for data in requests:
+        cached = None if refresh else await planner.PLAN_CACHE.get(plan_key(data))
+        if cached is not None:
+            results[data["trip_id"]] = cached
+        else:
+            todo.append(data)
+
+    limit = asyncio.Semaphore(lookup_concurrency)
+    shortlists = await _shared_shortlists(todo, limit)
+    planned = []
+    for data in todo:
+        shortlist = shortlists[json.dumps(canonical_interests(data["group_profiles"]), separators=(',', ':'))]
+        if isinstance(shortlist, BaseException):
+            errors[data["trip_id"]] = f"shortlist failed: {shortlist}"
+        else:
+            planned.append((data, shortlist))
+
+    legs = sorted({leg for data, shortlist in planned if planner.needs_fares(data)
+                   for leg in _legs(data, shortlist["candidates"])})
+    matrix, searches = await _shared_fares(legs, limit) if legs else ({}, 0)
+    fares = {"outbound": matrix, "return": matrix}
+
+    groups = asyncio.Semaphore(group_concurrency)
+
+    async def _plan(data, shortlist):
+        async with groups:
+            try:
+                results[data["trip_id"]] = await planner.plan_trip(
+                    data, refresh, shortlist=shortlist, fares=fares if planner.needs_fares(data) else None
+                )
+            except Exception as e:
+                traceback.print_exc()
+                errors[data["trip_id"]] = str(e)
+
+    await asyncio.gather(*(_plan(data, shortlist) for data, shortlist in planned))
+    return {
+        "results": results,
+        "errors": errors,
+        "stats": {
+            "trips": len(requests),
+            "cached": len(requests) - len(todo),
+            "shortlist_queries": len(shortlists),
+            "fare_legs": len(legs),
+            "fare_searches": searches,
+            "planned": sum(1 for data, _ in planned if data["trip_id"] in results),
+            "failed": len(errors),
+        },
+    }
+
+async def load_requests(trip_ids: List[str]) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    """Validated planner requests for `trip_ids`, and an error for each one that could not be loaded."""
+    requests, errors = [], {}
+    for trip_id, request in (await asyncio.to_thread(get_trips, trip_ids)).items():
+        if isinstance(request, Exception):
+            errors[trip_id] = str(request)
+            continue
+        try:
+            requests.append(planner.validate_basics(request))
+        except Exception as e:
+            errors[trip_id] = str(e)
+    return requests, errors
+
+async def plan_trip_ids(trip_ids: List[str], refresh: bool = False) -> Dict[str, Any]:
+    """plan_batch over groupTrips documents, with load failures reported like planning failures."""
+    requests, errors = await load_requests(trip_ids)
+    batch = await plan_batch(requests, refresh)
+    batch["errors"].update(errors)
+    batch["stats"].update(trips=len(requests) + len(errors), failed=len(batch["errors"]))
+    return batch
+
+async def _plan_pending(limit: int, refresh: bool) -> Dict[str, Any]:
+    # claimed like the watcher does, so a running watcher never plans the same trips
+    requests = []
+    for request in await asyncio.to_thread(get_pending_trips, limit):
+        if not await asyncio.to_thread(claim_trip, request["trip_id"]):
+            continue
+        try:
+            requests.append(planner.validate_basics(request))
+        except Exception as e:
+            print(f"Trip {request['trip_id']} is invalid: {e}")
+            await asyncio.to_thread(set_trip_status, request["trip_id"], "failed")
+    batch = await plan_batch(requests, refresh)
+    for data in requests:
+        # the same statuses the watcher sets
+        result = batch["results"].get(data["trip_id"])
+        status = "failed" if result is None else "planned" if planner.cacheable(result) else "partial"
+        await asyncio.to_thread(set_trip_status, data["trip_id"], status)
+    return batch
+
+async def main(args):
+    from agent_helpers import close_pools
+
+    try:
+        if args.pending:
+            batch = await _plan_pending(args.pending, args.refresh)
+        else:
+            batch = await plan_trip_ids(args.trip_ids, args.refresh)
+    finally:
+        await close_pools()
+    print(f"Batch stats: {json.dumps(batch['stats'])}")
+    for trip_id, error in batch["errors"].items():
+        print(f"Trip {trip_id} failed: {error}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(batch, f, indent=2, default=str)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan many groupTrips at once, sharing shortlists and fare searches")
+    parser.add_argument("trip_ids", nargs="*", help="groupTrips ids to plan")
+    parser.add_argument("--pending", type=int, default=0, metavar="N",
+                        help="instead, claim and plan up to N not-yet-planned trips (e.g. a nightly run)")
+    parser.add_argument("--refresh", action="store_true", help="skip the plan cache and recompute")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+    if not args.trip_ids and not args.pending:
+        parser.error("give trip ids or --pending N")
+    asyncio.run(main(args))
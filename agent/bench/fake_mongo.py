@@ -0,0 +1,174 @@
+import copy
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+# In-memory stand-in for the slice of the pymongo API this repo uses
+# (data_retrieve, cache_store, job_queue), so the benchmark needs no server.
+
+def _get(doc: Dict[str, Any], path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+def _match_value(value: Any, cond: Any) -> bool:
+    if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+        for op, arg in cond.items():
+            if op == "$in" and value not in arg:
+                return False
+            if op == "$lt" and not (value is not None and value < arg):
+                return False
+            if op == "$lte" and not (value is not None and value <= arg):
+                return False
+            if op == "$gt" and not (value is not None and value > arg):
+                return False
+            if op == "$gte" and not (value is not None and value >= arg):
+                return False
+        return True
+    return value == cond
+
+def _matches(doc: Dict[str, Any], flt: Optional[Dict[str, Any]]) -> bool:
+    return all(_match_value(_get(doc, k), v) for k, v in (flt or {}).items())
+
+def _apply(doc: Dict[str, Any], update: Dict[str, Any]):
+    for k, v in update.get("$set", {}).items():
+        doc[k] = copy.deepcopy(v)
+    for k, v in update.get("$inc", {}).items():
+        doc[k] = doc.get(k, 0) + v
+    for k, v in update.get("$push", {}).items():
+        doc.setdefault(k, []).append(copy.deepcopy(v))
+
+def _sorted(docs: List[Dict[str, Any]], sort) -> List[Dict[str, Any]]:
+    for key, direction in reversed(sort or []):
+        docs = sorted(docs, key=lambda d: (_get(d, key) is not None, _get(d, key)), reverse=direction < 0)
+    return docs
+
+
+class FakeCursor:
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self._docs = docs
+        self._limit = 0
+
+    def sort(self, key, direction=1):
+        self._docs = _sorted(self._docs, [(key, direction)] if isinstance(key, str) else key)
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    def __iter__(self):
+        return iter(self._docs[:self._limit] if self._limit else self._docs)
+
+
+class FakeCollection:
+    def __init__(self):
+        self._docs: Dict[Any, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create_index(self, *args, **kwargs):
+        return "fake_index"
+
+    def insert_one(self, doc: Dict[str, Any]):
+        doc = copy.deepcopy(doc)
+        doc.setdefault("_id", ObjectId())
+        with self._lock:
+            self._docs[doc["_id"]] = doc
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    def insert_many(self, docs: List[Dict[str, Any]]):
+        return SimpleNamespace(inserted_ids=[self.insert_one(d).inserted_id for d in docs])
+
+    def _find(self, flt, sort=None) -> List[Dict[str, Any]]:
+        with self._lock:
+            docs = [d for d in self._docs.values() if _matches(d, flt)]
+        return _sorted(docs, sort)
+
+    def find_one(self, flt=None, projection=None, sort=None):
+        docs = self._find(flt, sort)
+        return copy.deepcopy(docs[0]) if docs else None
+
+    def find(self, flt=None, projection=None):
+        return FakeCursor([copy.deepcopy(d) for d in self._find(flt)])
+
+    def replace_one(self, flt, doc, upsert=False):
+        with self._lock:
+            existing = next((d for d in self._docs.values() if _matches(d, flt)), None)
+            if existing is None and not upsert:
+                return SimpleNamespace(modified_count=0)
+            doc = copy.deepcopy(doc)
+            doc.setdefault("_id", existing["_id"] if existing else ObjectId())
+            if existing is not None:
+                del self._docs[existing["_id"]]
+            self._docs[doc["_id"]] = doc
+        return SimpleNamespace(modified_count=1)
+
+    def update_one(self, flt, update):
+        with self._lock:
+            doc = next((d for d in self._docs.values() if _matches(d, flt)), None)
+            if doc is None:
+                return SimpleNamespace(modified_count=0)
+            _apply(doc, update)
+        return SimpleNamespace(modified_count=1)
+
+    def update_many(self, flt, update):
+        with self._lock:
+            docs = [d for d in self._docs.values() if _matches(d, flt)]
+            for doc in docs:
+                _apply(doc, update)
+        return SimpleNamespace(modified_count=len(docs))
+
+    def find_one_and_update(self, flt, update, sort=None, return_document=ReturnDocument.BEFORE):
+        with self._lock:
+            docs = _sorted([d for d in self._docs.values() if _matches(d, flt)], sort)
+            if not docs:
+                return None
+            before = copy.deepcopy(docs[0])
+            _apply(docs[0], update)
+            return copy.deepcopy(docs[0]) if return_document == ReturnDocument.AFTER else before
+
+    def delete_one(self, flt):
+        with self._lock:
+            doc = next((d for d in self._docs.values() if _matches(d, flt)), None)
+            if doc is not None:
+                del self._docs[doc["_id"]]
+        return SimpleNamespace(deleted_count=int(doc is not None))
+
+    def count_documents(self, flt) -> int:
+        return len(self._find(flt))
+
+    def watch(self, *args, **kwargs):
+        from pymongo.errors import OperationFailure
+        raise OperationFailure("The $changeStream stage is only supported on replica sets")
+
+
+class FakeDatabase:
+    def __init__(self):
+        self._collections: Dict[str, FakeCollection] = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self._collections.setdefault(name, FakeCollection())
+
+
+class FakeMongoClient:
+    def __init__(self):
+        self._dbs: Dict[str, FakeDatabase] = {}
+
+    def __getitem__(self, name: str) -> FakeDatabase:
+        return self._dbs.setdefault(name, FakeDatabase())
+
+    def close(self):
+        pass
+
+
+def install() -> FakeMongoClient:
+    """Make data_retrieve.get_client() (and everything built on it) use an in-memory client."""
+    from MongoDB import data_retrieve
+
+    client = FakeMongoClient()
+    data_retrieve._client = client
+    return client
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from city_index import CITY_INDEX
+from prompts import count_tokens
+
+# OpenAI-compatible stand-in for the two endpoints the planner uses:
+#   /v1/chat/completions  shortlist reranking and destination blurbs
+#   /v1/responses         agent runs: one scripted search_live_prices_batch
+#                         call, then a plan built from the tool's fares
+
+# providers only cache prompts of at least this many tokens, in 128-token steps
+CACHE_MIN_TOKENS = 1024
+CACHE_STEP = 128
+
+class FakeOpenAI:
+    def __init__(self, latency: float = 0.5, jitter: float = 0.5, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._seen_prefixes = set()
+        self._lock = threading.Lock()
+
+    async def _delay(self):
+        if self.latency > 0:
+            spread = self._random.uniform(1 - self.jitter, 1 + self.jitter)
+            await asyncio.sleep(self.latency * spread)
+
+    def _cached(self, prefix: str, prompt_tokens: int) -> int:
+        with self._lock:
+            seen = prefix in self._seen_prefixes
+            self._seen_prefixes.add(prefix)
+        if not seen or prompt_tokens < CACHE_MIN_TOKENS:
+            return 0
+        return min(count_tokens(prefix), prompt_tokens) // CACHE_STEP * CACHE_STEP
+
+    async def chat_completions(self, request: Request) -> JSONResponse:
+        body = await request.json()
+        await self._delay()
+        messages = body["messages"]
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = json.loads(next(m["content"] for m in messages if m["role"] == "user"))
+        if "candidates" in system:
+            content = self._shortlist(user)
+        else:
+            content = self._destination(user)
+        text = json.dumps(content, separators=(',', ':'))
+
+        prompt_tokens = sum(count_tokens(m["content"]) for m in messages)
+        completion_tokens = count_tokens(text)
+        return JSONResponse({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": text},
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": self._cached(system, prompt_tokens)},
+            },
+        })
+
+    def _shortlist(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        options = request.get("options") or [
+            {"city": c["city"], "iata": c["iata"]} for c in CITY_INDEX.rank(request["interests"], 4)
+        ]
+        interests = list(request["interests"])
+        return {"candidates": [
+            {"city": o["city"], "iata": o["iata"], "score": 10 - i, "matched": interests[:2]}
+            for i, o in enumerate(options[:4])
+        ]}
+
+    def _destination(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        city = request["city"]
+        return {
+            "city": city,
+            "country": request.get("country") or "Europe",
+            "summary": f"{city} mixes historic streets, lively food markets and easy day trips, "
+                       f"with plenty to keep a group of friends busy from morning to late evening.",
+            "top_highlights": [f"{city} old town", f"{city} food market", f"{city} viewpoint"],
+        }
+
+    async def responses(self, request: Request) -> JSONResponse:
+        body = await request.json()
+        await self._delay()
+        items = body["input"] if isinstance(body["input"], list) else [{"role": "user", "content": body["input"]}]
+        trip = json.loads(next(i["content"] for i in items if i.get("role") == "user"))
+        tool_output = next((i["output"] for i in items if i.get("type") == "function_call_output"), None)
+
+        if tool_output is None:
+            output = [self._search_call(trip)]
+        else:
+            output = [self._message(json.dumps(self._plan(trip, _tool_result(tool_output))))]
+
+        instructions = body.get("instructions") or ""
+        input_tokens = count_tokens(instructions) + count_tokens(json.dumps(items)) + count_tokens(json.dumps(body.get("tools") or []))
+        output_tokens = count_tokens(json.dumps(output))
+        return JSONResponse({
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": body["model"],
+            "status": "completed",
+            "output": output,
+            "parallel_tool_calls": True,
+            "tool_choice": body.get("tool_choice") or "auto",
+            "tools": body.get("tools") or [],
+            "usage": {
+                "input_tokens": input_tokens,
+                "input_tokens_details": {"cached_tokens": self._cached(instructions, input_tokens)},
+                "output_tokens": output_tokens,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": input_tokens + output_tokens,
+            },
+        })
+
+    def _search_call(self, trip: Dict[str, Any]) -> Dict[str, Any]:
+        iata = _iata(trip["city"])
+        origins = [origin for origin, _ in trip["departures"]]
+        arguments = {
+            "originPlaces": origins + [iata],
+            "destinationPlaces": [iata] + origins,
+            "outboundDates": trip["dates"],
+            "top_k": 3,
+        }
+        return {
+            "type": "function_call",
+            "id": f"fc_{uuid.uuid4().hex}",
+            "call_id": f"call_{uuid.uuid4().hex}",
+            "name": "search_live_prices_batch",
+            "arguments": json.dumps(arguments),
+            "status": "completed",
+        }
+
+    def _plan(self, trip: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        iata = _iata(trip["city"])
+        matrix = result.get("matrix") or {}
+        out_date, return_date = trip["dates"]
+        flights: List[Dict[str, Any]] = []
+        for origin, _ in trip["departures"]:
+            out = _cheapest(matrix, origin, iata, out_date)
+            back = _cheapest(matrix, iata, origin, return_date)
+            if out is None or back is None:
+                continue
+            flights.append({
+                "departure_airport": origin,
+                "airline": out["carrier"],
+                "flight_no": (out["flight_numbers"] or [""])[0],
+                "outbound": _leg(out, out_date),
+                "return": _leg(back, return_date),
+            })
+        total = round(sum(f["outbound"]["price"] + f["return"]["price"] for f in flights), 2)
+        return {"flights": flights, "totals": {"total_flight_cost": total}}
+
+    def _message(self, text: str) -> Dict[str, Any]:
+        return {
+            "type": "message",
+            "id": f"msg_{uuid.uuid4().hex}",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/v1/chat/completions", self.chat_completions, methods=["POST"]),
+            Route("/v1/responses", self.responses, methods=["POST"]),
+        ])
+
+def _iata(city: str) -> str:
+    known = CITY_INDEX.lookup(city=city)
+    return known["iata"] if known else city[:3].upper()
+
+def _tool_result(output: str) -> Dict[str, Any]:
+    # the agents SDK passes MCP results on as the serialized text content item
+    value = json.loads(output)
+    if isinstance(value, dict) and "text" in value:
+        value = json.loads(value["text"])
+    return value or {}
+
+def _cheapest(matrix: Dict[str, Any], origin: str, destination: str, day: str) -> Optional[Dict[str, Any]]:
+    result = ((matrix.get(origin) or {}).get(destination) or {}).get(day)
+    itineraries = (result or {}).get("itineraries") or []
+    return min(itineraries, key=lambda i: i["price"]) if itineraries else None
+
+def _leg(itinerary: Dict[str, Any], day: str) -> Dict[str, Any]:
+    return {
+        "date": day,
+        "time": (itinerary.get("depart") or "T00:00").split("T")[1],
+        "price": itinerary["price"],
+        "booking_link": itinerary.get("deep_link") or "",
+    }
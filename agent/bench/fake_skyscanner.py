@@ -0,0 +1,157 @@
+import asyncio
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+# Skyscanner partners live-search stand-in: create returns an incomplete first
+# batch and a session token, the first poll completes the search. Payloads
+# follow the real shape (itineraries, legs, segments, places, carriers, agents,
+# sortingOptions) and size, since parsing them is part of what is measured.
+
+CARRIERS = [
+    ("ryr", "Ryanair", "FR"), ("ezy", "easyJet", "U2"), ("baw", "British Airways", "BA"),
+    ("vlg", "Vueling", "VY"), ("wzz", "Wizz Air", "W6"), ("dlh", "Lufthansa", "LH"),
+    ("afr", "Air France", "AF"), ("klm", "KLM", "KL"), ("tap", "TAP Air Portugal", "TP"),
+    ("ibe", "Iberia", "IB"), ("ita", "ITA Airways", "AZ"), ("sas", "SAS", "SK"),
+]
+AGENTS = ["skyscanner", "opodo", "kiwi", "trip", "edreams", "mytrip"]
+
+def _dt(value: datetime) -> Dict[str, int]:
+    return {"year": value.year, "month": value.month, "day": value.day,
+            "hour": value.hour, "minute": value.minute, "second": 0}
+
+def build_results(origin: str, destination: str, day: Dict[str, int], count: int) -> Dict[str, Any]:
+    """A complete live-search `content` block with `count` priced itineraries, seeded by the leg."""
+    rng = random.Random(f"{origin}:{destination}:{day['year']}-{day['month']}-{day['day']}")
+    base = datetime(day["year"], day["month"], day["day"], 6, 0)
+    places = {
+        "p-o": {"entityId": "p-o", "iata": origin, "name": origin, "type": "PLACE_TYPE_AIRPORT"},
+        "p-d": {"entityId": "p-d", "iata": destination, "name": destination, "type": "PLACE_TYPE_AIRPORT"},
+        "p-x": {"entityId": "p-x", "iata": "FRA", "name": "Frankfurt", "type": "PLACE_TYPE_AIRPORT"},
+    }
+    carriers = {cid: {"name": name, "displayCode": code, "iata": code, "allianceId": "0"} for cid, name, code in CARRIERS}
+    itineraries, legs, segments, best = {}, {}, {}, []
+    base_fare = rng.randint(30, 140)
+
+    for n in range(count):
+        carrier_id, _, _ = rng.choice(CARRIERS)
+        stops = 0 if rng.random() < 0.6 else 1
+        depart = base + timedelta(minutes=rng.randrange(0, 16 * 60, 5))
+        duration = rng.randint(90, 200) + stops * rng.randint(60, 180)
+        arrive = depart + timedelta(minutes=duration)
+        leg_id = f"{origin}-{destination}-{n}"
+        segment_ids = []
+        hops = [("p-o", "p-d")] if stops == 0 else [("p-o", "p-x"), ("p-x", "p-d")]
+        for s, (a, b) in enumerate(hops):
+            segment_id = f"{leg_id}-s{s}"
+            segments[segment_id] = {
+                "originPlaceId": a, "destinationPlaceId": b,
+                "departureDateTime": _dt(depart), "arrivalDateTime": _dt(arrive),
+                "durationInMinutes": duration // len(hops),
+                "marketingFlightNumber": str(rng.randint(100, 9999)),
+                "marketingCarrierId": carrier_id, "operatingCarrierId": carrier_id,
+            }
+            segment_ids.append(segment_id)
+        legs[leg_id] = {
+            "originPlaceId": "p-o", "destinationPlaceId": "p-d",
+            "departureDateTime": _dt(depart), "arrivalDateTime": _dt(arrive),
+            "durationInMinutes": duration, "stopCount": stops,
+            "marketingCarrierIds": [carrier_id], "operatingCarrierIds": [carrier_id],
+            "segmentIds": segment_ids,
+        }
+        price = base_fare + rng.randint(0, 160) - stops * 15
+        itineraries[f"it-{leg_id}"] = {
+            "legIds": [leg_id],
+            "pricingOptions": [
+                {
+                    "price": {"amount": str((price + extra) * 1000), "unit": "PRICE_UNIT_MILLI", "updateStatus": "PRICE_UPDATE_STATUS_UNSPECIFIED"},
+                    "agentIds": [agent],
+                    "items": [{
+                        "agentId": agent,
+                        "deepLink": f"https://www.skyscanner.net/transport_deeplink/4.0/UK/en-GB/GBP/{agent}/1/{leg_id}",
+                        "fares": [{"segmentId": sid, "bookingCode": "Y", "fareBasisCode": "YOW"} for sid in segment_ids],
+                    }],
+                }
+                for extra, agent in zip((0, rng.randint(1, 25), rng.randint(5, 40)), rng.sample(AGENTS, 3))
+            ],
+            "isSelfTransfer": False,
+            "isProtectedSelfTransfer": False,
+        }
+        best.append({"itineraryId": f"it-{leg_id}", "score": round(rng.random(), 4)})
+
+    best.sort(key=lambda s: -s["score"])
+    return {
+        "results": {
+            "itineraries": itineraries, "legs": legs, "segments": segments,
+            "places": places, "carriers": carriers,
+            "agents": {a: {"name": a.title(), "type": "AGENT_TYPE_TRAVEL_AGENT", "rating": 4.2} for a in AGENTS},
+            "alliances": {},
+        },
+        "sortingOptions": {
+            "best": best,
+            "cheapest": [{"itineraryId": i, "score": 1.0} for i in list(itineraries)[:10]],
+            "fastest": [{"itineraryId": i, "score": 1.0} for i in list(itineraries)[:10]],
+        },
+        "stats": {"itineraries": {"total": {"count": len(itineraries)}}},
+    }
+
+def _partial(content: Dict[str, Any], share: float) -> Dict[str, Any]:
+    results = content["results"]
+    keep = dict(list(results["itineraries"].items())[:max(1, int(len(results["itineraries"]) * share))])
+    return dict(content, results=dict(results, itineraries=keep))
+
+class FakeSkyscanner:
+    def __init__(self, latency: float = 0.3, jitter: float = 0.5, itineraries: int = 150, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.itineraries = itineraries
+        self._random = random.Random(seed)
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    async def _delay(self):
+        if self.latency > 0:
+            await asyncio.sleep(self.latency * self._random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def create(self, request: Request) -> JSONResponse:
+        query = (await request.json())["query"]
+        leg = query["queryLegs"][0]
+        await self._delay()
+        content = build_results(
+            leg["origin_place_id"]["iata"], leg["destination_place_id"]["iata"], leg["date"], self.itineraries
+        )
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[token] = content
+        return JSONResponse({
+            "sessionToken": token,
+            "status": "RESULT_STATUS_INCOMPLETE",
+            "action": "RESULT_ACTION_REPLACED",
+            "content": _partial(content, 0.3),
+        })
+
+    async def poll(self, request: Request) -> JSONResponse:
+        token = request.path_params["token"]
+        await self._delay()
+        with self._lock:
+            content = self._sessions.pop(token, None)
+        if content is None:
+            return JSONResponse({"code": 5, "message": "Session not found"}, status_code=404)
+        return JSONResponse({
+            "sessionToken": token,
+            "status": "RESULT_STATUS_COMPLETE",
+            "action": "RESULT_ACTION_REPLACED",
+            "content": content,
+        })
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/v3/flights/live/search/create", self.create, methods=["POST"]),
+            Route("/v3/flights/live/search/poll/{token}", self.poll, methods=["POST"]),
+        ])
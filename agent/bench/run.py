@@ -0,0 +1,201 @@
+"""
+Offline benchmark of the /plan-trip path against local fakes.
+
+Runs the real app.py -> shortlister -> ask_agent -> MCP server.py ->
+live_prices pipeline, with OpenAI, Skyscanner and Mongo replaced by the
+stand-ins in this directory, and reports throughput plus p50/p95/p99 latency
+per pipeline stage (the metrics.span stages). Everything runs in this one
+process, so no API keys or network access are needed.
+
+    cd agent && python -m bench.run --requests 40 --concurrency 8
+"""
+import argparse
+import contextlib
+import json
+import logging
+import math
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+AGENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+ORIGINS = ["LHR", "MAN", "EDI", "DUB", "AMS", "BER", "MAD", "CDG", "FCO", "VIE", "CPH", "PRG"]
+INTERESTS = ["beach", "nightlife", "food", "culture", "history", "hiking", "art", "music",
+             "wine", "relaxation", "shopping", "mountain", "nature", "architecture"]
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _serve(app, port: int):
+    """Serve an ASGI app with uvicorn on a daemon thread and wait until it accepts connections."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name=f"bench-{port}", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+def _configure(args, ports: Dict[str, int]):
+    # must run before app (and everything it imports) reads its settings
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{ports['openai']}/v1",
+        "SKYSCANNER_API_KEY": "bench",
+        "SKYSCANNER_BASE_URL": f"http://127.0.0.1:{ports['skyscanner']}",
+        "MCP_SSE_URL": f"http://127.0.0.1:{ports['mcp']}/sse",
+        "MCP_TRANSPORT": args.mcp_transport,
+        "SHORTLIST_MODE": args.shortlist_mode,
+        "SHORTLIST_CACHE_BACKEND": "memory",
+        "GROUP_OPTIMIZER": "1" if args.optimizer else "0",
+    })
+    os.environ.pop("QUOTE_CACHE_PATH", None)
+
+def seed_trips(collection, n: int, seed: int) -> List[str]:
+    """Insert `n` random group trips shaped like the app's groupTrips documents."""
+    rng = random.Random(seed)
+    ids = []
+    for _ in range(n):
+        start = date.today() + timedelta(days=rng.randint(21, 120))
+        end = start + timedelta(days=rng.randint(3, 7))
+        users = [{
+            "from": rng.choice(ORIGINS),
+            "budget": {"max": rng.randint(250, 900)},
+            "dates": {"start": start.isoformat(), "end": end.isoformat()},
+            "interests": rng.sample(INTERESTS, rng.randint(2, 4)),
+        } for _ in range(rng.randint(2, 5))]
+        result = collection.insert_one({"users": users, "createdAt": datetime.now(timezone.utc)})
+        ids.append(str(result.inserted_id))
+    return ids
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+def summarize(samples: Dict[str, List[float]], errors: Dict[str, int]) -> Dict[str, Dict[str, Any]]:
+    return {
+        stage: {
+            "count": len(values),
+            "errors": errors.get(stage, 0),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+            "max_ms": round(max(values) * 1000, 1),
+        }
+        for stage, values in sorted(samples.items())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /plan-trip against local OpenAI, Skyscanner and Mongo fakes")
+    parser.add_argument("--requests", type=int, default=20, help="number of /plan-trip calls")
+    parser.add_argument("--concurrency", type=int, default=4, help="calls in flight at once")
+    parser.add_argument("--trips", type=int, default=None, help="distinct seeded trips (default: one per request)")
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="mean fake OpenAI latency, seconds")
+    parser.add_argument("--skyscanner-latency", type=float, default=0.3, help="mean fake Skyscanner latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency spread, as a fraction of the mean")
+    parser.add_argument("--itineraries", type=int, default=150, help="itineraries per fake live-search result")
+    parser.add_argument("--shortlist-mode", choices=("index", "rerank", "llm"), default="rerank")
+    parser.add_argument("--mcp-transport", choices=("sse", "stdio", "inprocess"), default="sse",
+                        help="how agent runs reach the MCP tools (MCP_TRANSPORT)")
+    parser.add_argument("--optimizer", action="store_true", help="plan with the group optimizer instead of agent runs")
+    parser.add_argument("--batch", type=int, default=0, metavar="N",
+                        help="send the trips N at a time to POST /plan-trips instead of one per /plan-trip call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's own logging")
+    args = parser.parse_args()
+
+    ports = {"openai": _free_port(), "skyscanner": _free_port(), "mcp": _free_port()}
+    _configure(args, ports)
+    sys.path.insert(0, AGENT_DIR)
+    sys.path.append(os.path.join(AGENT_DIR, "mcp"))
+
+    from bench import fake_mongo
+    from bench.fake_openai import FakeOpenAI
+    from bench.fake_skyscanner import FakeSkyscanner
+    import metrics
+    from prompts import TOKENS
+
+    client = fake_mongo.install()
+    trip_ids = seed_trips(client["groupTrips"]["groupTrips"], args.trips or args.requests, args.seed)
+
+    _serve(FakeOpenAI(args.openai_latency, args.jitter, args.seed).app(), ports["openai"])
+    _serve(FakeSkyscanner(args.skyscanner_latency, args.jitter, args.itineraries, args.seed).app(), ports["skyscanner"])
+    if args.mcp_transport == "sse":
+        import server as mcp_server
+        _serve(mcp_server.mcp.sse_app(), ports["mcp"])
+
+    from app import app
+
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+
+    def _record(stage: str, labels: Dict[str, Any], seconds: float, failed: bool):
+        with lock:
+            samples[stage].append(seconds)
+            if failed:
+                errors[stage] += 1
+
+    metrics.add_listener(_record)
+    http = app.test_client()
+
+    def _one(i: int):
+        trip_id = trip_ids[i % len(trip_ids)]
+        started = time.perf_counter()
+        response = http.post(f"/plan-trip?trip_id={trip_id}&refresh=1")
+        body = response.get_json() or {}
+        _record("request", {}, time.perf_counter() - started, response.status_code != 200)
+        return response.status_code, len(body.get("plans") or [])
+
+    def _batch(i: int):
+        ids = [trip_ids[j % len(trip_ids)] for j in range(i, min(i + args.batch, args.requests))]
+        started = time.perf_counter()
+        response = http.post("/plan-trips?refresh=1", json={"trip_ids": ids})
+        body = response.get_json() or {}
+        _record("request", {}, time.perf_counter() - started, response.status_code != 200)
+        results = body.get("results") or {}
+        return [(200 if t in results else 500, len((results.get(t) or {}).get("plans") or [])) for t in ids]
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    if not args.verbose:
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+    started = time.perf_counter()
+    with quiet, ThreadPoolExecutor(args.concurrency) as pool:
+        if args.batch:
+            outcomes = [o for batch in pool.map(_batch, range(0, args.requests, args.batch)) for o in batch]
+        else:
+            outcomes = list(pool.map(_one, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json_path", "verbose")},
+        "requests": args.requests,
+        "ok": sum(1 for status, _ in outcomes if status == 200),
+        "plans": sum(plans for _, plans in outcomes),
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(args.requests / elapsed, 3),
+        "stages": summarize(samples, errors),
+        "tokens": TOKENS.stats(),
+    }
+
+    print(f"{report['ok']}/{args.requests} requests ok, {report['plans']} plans in {report['seconds']}s "
+          f"({report['throughput_rps']} req/s at concurrency {args.concurrency})")
+    print(f"{'stage':<24}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<24}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+from fares import FareMatrix, cheapest
+
+def prefilter(data: Dict[str, Any], candidates: List[Dict[str, Any]], fares: Dict[str, FareMatrix],
+              dates: Optional[List[Tuple[date, date]]] = None) -> Tuple[List[int], List[Dict[str, Any]]]:
+    """
+    Split shortlisted candidates by whether every member can afford the trip.
+
+    A candidate is infeasible when, for some member, the cheapest known outbound
+    plus the cheapest known return fare exceeds that member's budget. Legs with
+    no price data do not count against a candidate. `dates` gives each
+    candidate's (outbound, return) days when they differ from the request's.
+
+    Returns:
+        (indices of candidates worth planning, pruned entries {"index", "city",
+        "iata", "reasons"}). If no candidate is feasible, the one that overshoots
+        the budgets by the least is kept so the group still gets a plan.
+    """
+    feasible, pruned, overshoot = [], [], {}
+    for i, c in enumerate(candidates):
+        reasons, over = [], 0.0
+        start, end = dates[i] if dates else (data["start_date"], data["end_date"])
+        for leg in data["departures"]:
+            out = cheapest(fares["outbound"], leg["airport"], c["iata"], start)
+            back = cheapest(fares["return"], c["iata"], leg["airport"], end)
+            if out is None or back is None:
+                continue
+            if out + back > leg["budget"]:
+                over += out + back - leg["budget"]
+                reasons.append(
+                    f"{leg['airport']}: cheapest round trip {out + back:.0f} exceeds budget {leg['budget']}"
+                )
+        if reasons:
+            overshoot[i] = over
+            pruned.append({"index": i, "city": c["city"], "iata": c["iata"], "reasons": reasons})
+        else:
+            feasible.append(i)
+
+    if not feasible and pruned:
+        best = min(overshoot, key=overshoot.get)
+        feasible = [best]
+        pruned = [p for p in pruned if p["index"] != best]
+    return feasible, pruned
@@ -0,0 +1,232 @@
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+# European airport cities and what they are good for. IATA is the main airport
+# Skyscanner should search for that city.
+CITIES: List[Tuple[str, str, str, Tuple[str, ...]]] = [
+    # city, iata, country, tags
+    ("Amsterdam", "AMS", "Netherlands", ("culture", "art", "history", "nightlife")),
+    ("Antalya", "AYT", "Turkey", ("beach", "history", "relaxation")),
+    ("Athens", "ATH", "Greece", ("history", "culture", "food", "nightlife", "beach")),
+    ("Barcelona", "BCN", "Spain", ("culture", "beach", "nightlife", "food", "architecture", "art")),
+    ("Bari", "BRI", "Italy", ("beach", "food", "history")),
+    ("Belgrade", "BEG", "Serbia", ("nightlife", "food", "history")),
+    ("Bergen", "BGO", "Norway", ("nature", "hiking", "mountain")),
+    ("Berlin", "BER", "Germany", ("culture", "nightlife", "art", "history", "music")),
+    ("Bilbao", "BIO", "Spain", ("culture", "art", "food", "architecture")),
+    ("Bologna", "BLQ", "Italy", ("food", "culture", "history")),
+    ("Bordeaux", "BOD", "France", ("wine", "food", "culture")),
+    ("Brussels", "BRU", "Belgium", ("food", "culture", "history", "architecture")),
+    ("Bucharest", "OTP", "Romania", ("nightlife", "history", "culture")),
+    ("Budapest", "BUD", "Hungary", ("nightlife", "culture", "history", "relaxation", "architecture")),
+    ("Cagliari", "CAG", "Italy", ("beach", "nature", "relaxation")),
+    ("Catania", "CTA", "Italy", ("beach", "food", "mountain", "history", "hiking")),
+    ("Copenhagen", "CPH", "Denmark", ("culture", "food", "architecture")),
+    ("Corfu", "CFU", "Greece", ("beach", "nature", "relaxation")),
+    ("Dublin", "DUB", "Ireland", ("nightlife", "culture", "history", "music")),
+    ("Dubrovnik", "DBV", "Croatia", ("beach", "history", "culture")),
+    ("Edinburgh", "EDI", "United Kingdom", ("culture", "history", "nightlife", "nature", "hiking")),
+    ("Faro", "FAO", "Portugal", ("beach", "relaxation", "nature")),
+    ("Florence", "FLR", "Italy", ("art", "culture", "food", "wine", "history")),
+    ("Funchal", "FNC", "Portugal", ("nature", "hiking", "mountain", "relaxation")),
+    ("Geneva", "GVA", "Switzerland", ("mountain", "ski", "nature", "shopping")),
+    ("Glasgow", "GLA", "United Kingdom", ("music", "nightlife", "culture")),
+    ("Granada", "GRX", "Spain", ("culture", "history", "mountain", "ski", "architecture")),
+    ("Hamburg", "HAM", "Germany", ("nightlife", "culture", "music", "food")),
+    ("Helsinki", "HEL", "Finland", ("culture", "nature", "architecture")),
+    ("Heraklion", "HER", "Greece", ("beach", "history", "nature", "hiking")),
+    ("Ibiza", "IBZ", "Spain", ("beach", "nightlife", "music", "relaxation")),
+    ("Innsbruck", "INN", "Austria", ("mountain", "ski", "hiking", "nature")),
+    ("Istanbul", "IST", "Turkey", ("culture", "history", "food", "shopping", "nightlife")),
+    ("Krakow", "KRK", "Poland", ("history", "culture", "nightlife", "food")),
+    ("Lanzarote", "ACE", "Spain", ("beach", "nature", "relaxation", "adventure")),
+    ("Larnaca", "LCA", "Cyprus", ("beach", "history", "relaxation")),
+    ("Las Palmas", "LPA", "Spain", ("beach", "nature", "relaxation", "hiking")),
+    ("Lisbon", "LIS", "Portugal", ("culture", "history", "food", "nightlife", "beach")),
+    ("Ljubljana", "LJU", "Slovenia", ("nature", "culture", "hiking")),
+    ("London", "LHR", "United Kingdom", ("culture", "art", "history", "nightlife", "music", "shopping")),
+    ("Lyon", "LYS", "France", ("food", "wine", "culture", "history")),
+    ("Madrid", "MAD", "Spain", ("culture", "art", "nightlife", "food", "shopping")),
+    ("Malaga", "AGP", "Spain", ("beach", "culture", "food", "relaxation")),
+    ("Malta", "MLA", "Malta", ("beach", "history", "nightlife", "culture")),
+    ("Manchester", "MAN", "United Kingdom", ("music", "nightlife", "culture")),
+    ("Marseille", "MRS", "France", ("beach", "food", "culture")),
+    ("Milan", "MXP", "Italy", ("shopping", "art", "culture", "food")),
+    ("Munich", "MUC", "Germany", ("culture", "food", "nightlife", "mountain")),
+    ("Mykonos", "JMK", "Greece", ("beach", "nightlife", "relaxation")),
+    ("Naples", "NAP", "Italy", ("food", "history", "beach", "culture")),
+    ("Nice", "NCE", "France", ("beach", "culture", "food", "relaxation")),
+    ("Olbia", "OLB", "Italy", ("beach", "nature", "relaxation")),
+    ("Oslo", "OSL", "Norway", ("nature", "culture", "hiking")),
+    ("Palermo", "PMO", "Italy", ("food", "history", "beach", "culture")),
+    ("Palma de Mallorca", "PMI", "Spain", ("beach", "nightlife", "nature", "relaxation", "hiking")),
+    ("Paris", "CDG", "France", ("culture", "art", "food", "shopping", "romance", "architecture")),
+    ("Porto", "OPO", "Portugal", ("culture", "food", "wine", "architecture", "history")),
+    ("Prague", "PRG", "Czech Republic", ("history", "culture", "nightlife", "architecture")),
+    ("Reykjavik", "KEF", "Iceland", ("nature", "hiking", "adventure")),
+    ("Riga", "RIX", "Latvia", ("history", "architecture", "nightlife")),
+    ("Rome", "FCO", "Italy", ("culture", "history", "art", "food")),
+    ("Rovaniemi", "RVN", "Finland", ("nature", "adventure", "ski")),
+    ("Salzburg", "SZG", "Austria", ("culture", "music", "mountain", "history")),
+    ("San Sebastian", "EAS", "Spain", ("food", "beach", "culture")),
+    ("Santorini", "JTR", "Greece", ("beach", "romance", "relaxation", "wine")),
+    ("Seville", "SVQ", "Spain", ("culture", "history", "food", "architecture")),
+    ("Sofia", "SOF", "Bulgaria", ("history", "culture", "mountain", "ski")),
+    ("Split", "SPU", "Croatia", ("beach", "nightlife", "history")),
+    ("Stockholm", "ARN", "Sweden", ("culture", "nature", "architecture")),
+    ("Tallinn", "TLL", "Estonia", ("history", "culture", "nightlife")),
+    ("Tenerife", "TFS", "Spain", ("beach", "nature", "hiking", "mountain", "relaxation")),
+    ("Thessaloniki", "SKG", "Greece", ("food", "nightlife", "history", "beach")),
+    ("Tirana", "TIA", "Albania", ("culture", "food", "nature")),
+    ("Tivat", "TIV", "Montenegro", ("beach", "history", "nature")),
+    ("Toulouse", "TLS", "France", ("food", "culture")),
+    ("Tromso", "TOS", "Norway", ("nature", "adventure", "ski", "hiking")),
+    ("Turin", "TRN", "Italy", ("food", "culture", "mountain", "ski")),
+    ("Valencia", "VLC", "Spain", ("beach", "food", "culture", "architecture")),
+    ("Venice", "VCE", "Italy", ("culture", "art", "romance", "architecture")),
+    ("Verona", "VRN", "Italy", ("culture", "history", "romance", "wine")),
+    ("Vienna", "VIE", "Austria", ("culture", "music", "art", "history", "food")),
+    ("Warsaw", "WAW", "Poland", ("history", "culture")),
+    ("Zakynthos", "ZTH", "Greece", ("beach", "nature", "nightlife")),
+    ("Zurich", "ZRH", "Switzerland", ("mountain", "nature", "shopping", "culture")),
+]
+
+CATEGORIES = sorted({tag for *_, tags in CITIES for tag in tags})
+
+# free-text interests people type, mapped onto index categories
+SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    "party": ("nightlife",), "parties": ("nightlife",), "partying": ("nightlife",),
+    "clubbing": ("nightlife",), "clubs": ("nightlife",), "bars": ("nightlife",),
+    "museum": ("culture", "art"), "museums": ("culture", "art"), "galleries": ("art",),
+    "sightseeing": ("culture", "history"), "historic": ("history",), "heritage": ("history",),
+    "sea": ("beach",), "sun": ("beach",), "swimming": ("beach",), "islands": ("beach",),
+    "surf": ("beach", "adventure"), "surfing": ("beach", "adventure"),
+    "mountains": ("mountain",), "skiing": ("ski", "mountain"), "snowboarding": ("ski", "mountain"),
+    "snow": ("ski", "mountain"), "hike": ("hiking", "nature"), "trekking": ("hiking", "nature"),
+    "walking": ("hiking",), "outdoors": ("nature",), "wildlife": ("nature",),
+    "gastronomy": ("food",), "foodie": ("food",), "cuisine": ("food",), "restaurants": ("food",),
+    "wine tasting": ("wine",), "vineyards": ("wine",),
+    "spa": ("relaxation",), "wellness": ("relaxation",), "chill": ("relaxation",),
+    "romantic": ("romance",), "concerts": ("music",), "festivals": ("music", "nightlife"),
+    "live music": ("music",), "extreme sports": ("adventure",),
+}
+
+SHORTLIST_SIZE = 4
+
+def _categories(interest: str) -> Tuple[str, ...]:
+    interest = interest.strip().lower()
+    if interest in CATEGORIES:
+        return (interest,)
+    if interest in SYNONYMS:
+        return SYNONYMS[interest]
+    # "street food", "old town history", ...
+    words = set(re.findall(r"[a-z]+", interest))
+    return tuple(sorted({c for c in CATEGORIES if c in words} | {
+        c for w in words if w in SYNONYMS for c in SYNONYMS[w]
+    }))
+
+def _norm_city(name: str) -> str:
+    return re.sub(r"[^a-z]", "", name.lower())
+
+class CityIndex:
+    """
+    Precomputed interest -> city index used to shortlist without an LLM.
+
+    Each category keeps the positions of the cities tagged with it, so scoring a
+    group is one pass over the matching postings per interest category rather
+    than a scan of every city.
+    """
+
+    def __init__(self, cities=CITIES):
+        self.cities = [
+            {"city": city, "iata": iata, "country": country, "tags": set(tags)}
+            for city, iata, country, tags in cities
+        ]
+        self.postings: Dict[str, List[int]] = {c: [] for c in CATEGORIES}
+        for pos, c in enumerate(self.cities):
+            for tag in c["tags"]:
+                self.postings[tag].append(pos)
+        self.by_iata = {c["iata"]: c for c in self.cities}
+        self.by_name = {_norm_city(c["city"]): c for c in self.cities}
+
+    def rank(self, interests: Dict[str, int], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Rank cities for a group.
+
+        Args:
+            interests: {interest: number of members who share it}
+            limit: number of candidates to return, every city when None
+
+        Returns:
+            candidates shaped like the shortlister output, {"city", "iata", "score", "matched"},
+            ordered by score then city name; score is the member-weighted share of the
+            group's interests the city covers
+        """
+        scores = [0] * len(self.cities)
+        matched: List[List[str]] = [[] for _ in self.cities]
+        total = 0
+        for interest, weight in interests.items():
+            total += weight
+            hit = set()
+            for category in _categories(interest):
+                hit.update(self.postings[category])
+            for pos in hit:
+                scores[pos] += weight
+                matched[pos].append(interest)
+
+        order = sorted(
+            range(len(self.cities)),
+            key=lambda pos: (-scores[pos], self.cities[pos]["city"]),
+        )
+        if limit is not None:
+            order = order[:limit]
+        return [
+            {
+                "city": self.cities[pos]["city"],
+                "iata": self.cities[pos]["iata"],
+                "score": round(scores[pos] / total, 2) if total else 0,
+                "matched": matched[pos],
+            }
+            for pos in order
+        ]
+
+    def shortlist(self, interests: Dict[str, int]) -> Dict[str, Any]:
+        return {"candidates": self.rank(interests, SHORTLIST_SIZE)}
+
+    def lookup(self, iata: Optional[str] = None, city: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if iata and iata.strip().upper() in self.by_iata:
+            return self.by_iata[iata.strip().upper()]
+        if city:
+            return self.by_name.get(_norm_city(city))
+        return None
+
+    def validate(self, candidates: List[Dict[str, Any]], interests: Dict[str, int]) -> List[Dict[str, Any]]:
+        """
+        Check LLM-produced candidates against the index before agents are spent on them.
+
+        A candidate whose city is in the index gets the index's airport code; one
+        whose city is unknown is kept only if its `iata` is a known code, and is
+        dropped otherwise.
+        Duplicates are removed, and the list is topped up from the index ranking
+        so exactly SHORTLIST_SIZE candidates remain.
+        """
+        out, seen = [], set()
+        for c in candidates:
+            known = self.lookup(city=c.get("city")) or self.lookup(iata=c.get("iata"))
+            if known is None:
+                print(f"Dropping shortlist candidate with unknown airport: {c}")
+                continue
+            if known["iata"] in seen:
+                continue
+            seen.add(known["iata"])
+            out.append({**c, "city": known["city"], "iata": known["iata"]})
+        for c in self.rank(interests):
+            if len(out) >= SHORTLIST_SIZE:
+                break
+            if c["iata"] not in seen:
+                seen.add(c["iata"])
+                out.append(c)
+        return out[:SHORTLIST_SIZE]
+
+
+CITY_INDEX = CityIndex()
@@ -0,0 +1,96 @@
+import asyncio, copy, json, os
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from ttl_cache import TTLCache
+from city_index import CITY_INDEX
+from scheduler import OPENAI
+from MongoDB.cache_store import MongoStore
+from prompts import DESTINATION_INSTRUCTIONS, destination_request, openai_client, prompt_kind
+
+load_dotenv()
+
+# destination blurbs only need a small model; they are written once per city
+DESTINATION_MODEL = os.getenv("DESTINATION_MODEL", "gpt-4.1-mini")
+DESTINATION_CACHE_TTL = float(os.getenv("DESTINATION_CACHE_TTL", str(30 * 86400)))
+DESTINATION_CACHE_SIZE = int(os.getenv("DESTINATION_CACHE_SIZE", "512"))
+# bump when the prompt or the content format changes so stale entries are regenerated
+DESTINATION_CACHE_VERSION = 1
+
+class DestinationContent:
+    """
+    Per-city destination blocks ({city, country, summary, top_highlights}),
+    generated once by a light model call and cached in memory and in Mongo
+    (`groupTrips.destinationContent`). The content depends only on the city,
+    so every group and date range shares it. Concurrent requests for the same
+    city share one model call.
+    """
+
+    def __init__(self, model: str = DESTINATION_MODEL, ttl: float = DESTINATION_CACHE_TTL,
+                 maxsize: int = DESTINATION_CACHE_SIZE):
+        self.model = model
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, store=MongoStore("destinationContent"))
+        self._client: Optional[AsyncOpenAI] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def _key(self, city: str, iata: str) -> str:
+        return f"v{DESTINATION_CACHE_VERSION}:{self.model}:{iata.strip().upper()}:{city.strip().lower()}"
+
+    async def get(self, city: str, iata: str) -> Dict[str, Any]:
+        """The destination block for a city, generating it on first use."""
+        key = self._key(city, iata)
+        try:
+            cached = await asyncio.to_thread(self.cache.get, key)
+        except Exception as e:
+            print(f"Destination cache read failed: {e}")
+            cached = None
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate(key, city, iata))
+            self._inflight[key] = task
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def _generate(self, key: str, city: str, iata: str) -> Dict[str, Any]:
+        try:
+            content = await self._ask_model(city, iata)
+            try:
+                await asyncio.to_thread(self.cache.set, key, content)
+            except Exception as e:
+                print(f"Destination cache write failed: {e}")
+            return content
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _ask_model(self, city: str, iata: str) -> Dict[str, Any]:
+        if self._client is None:
+            self._client = openai_client(os.getenv("OPENAI_API_KEY"))
+        known = CITY_INDEX.lookup(iata, city) or {}
+        with prompt_kind("destination"):
+            resp = await OPENAI.call(
+                self._client.chat.completions.create,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": DESTINATION_INSTRUCTIONS},
+                    {"role": "user", "content": destination_request(city, iata, known.get("country"))},
+                ],
+                temperature=0.7,
+                response_format={"type": "json_object"},
+            )
+        data = json.loads(resp.choices[0].message.content)
+        return {
+            "city": city,
+            "country": data.get("country") or known.get("country"),
+            "summary": data.get("summary", ""),
+            "top_highlights": list(data.get("top_highlights") or [])[:3],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "inflight": len(self._inflight)}
+
+def fallback(city: str, iata: str) -> Dict[str, Any]:
+    """A minimal destination block for when generation fails."""
+    known = CITY_INDEX.lookup(iata, city) or {}
+    return {"city": city, "country": known.get("country"), "summary": "", "top_highlights": []}
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Iterator, Optional
+
+
+class BackgroundLoop:
+    """
+    A single event loop running forever on a daemon thread.
+
+    Sync callers (Flask views, ShortlisterSync) hand coroutines to this loop
+    instead of calling `asyncio.run`, so the loop, and every client bound to
+    it (AsyncOpenAI, pooled MCP sessions), lives for the whole process.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self.loop.run_forever, name="sweetspot-loop", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, coro: Awaitable[Any]) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run `coro` on the shared loop and block the calling thread for its result."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("BackgroundLoop.run called from the loop thread; await instead")
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, agen: AsyncIterator[Any]) -> Iterator[Any]:
+        """
+        Drive an async generator on the shared loop from a sync iterator
+        (e.g. a streamed WSGI response). Closing the iterator early closes the
+        async generator too, so its cleanup runs.
+        """
+        it = agen.__aiter__()
+        try:
+            while True:
+                try:
+                    item = self.run(it.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            self.run(it.aclose())
+
+
+LOOP = BackgroundLoop()
+
+def run(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    return LOOP.run(coro, timeout)
+
+def iterate(agen: AsyncIterator[Any]) -> Iterator[Any]:
+    return LOOP.iterate(agen)
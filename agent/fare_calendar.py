@@ -0,0 +1,87 @@
+import os
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+from fares import FareMatrix, cheapest, date_window
+
+# largest ±N-day window a request may ask for; each extra day is one more batched search per route
+FLEX_DAYS_MAX = int(os.environ.get("FLEX_DAYS_MAX", "3"))
+# most nights a flexible date pair may add to or drop from the requested stay
+FLEX_LENGTH_MAX = int(os.environ.get("FLEX_LENGTH_MAX", "1"))
+
+def build_calendar(data: Dict[str, Any], iata: str, fares: Dict[str, FareMatrix]) -> List[Dict[str, Any]]:
+    """
+    Group fare for every (outbound, return) date pair in the flexible window.
+
+    Each member pays their cheapest known outbound on the first date plus their
+    cheapest known return on the second. A pair with any member unpriced has no
+    total.
+
+    Returns:
+        [{"outbound_date", "return_date", "total_flight_cost", "within_budget"}]
+        for every pair whose return is after the outbound and whose stay is
+        within FLEX_LENGTH_MAX nights of the requested one.
+    """
+    flex = data.get("flex_days", 0)
+    nights = (data["end_date"] - data["start_date"]).days
+    days = []
+    for out_day in date_window(data["start_date"], flex):
+        for back_day in date_window(data["end_date"], flex):
+            if back_day <= out_day or abs((back_day - out_day).days - nights) > FLEX_LENGTH_MAX:
+                continue
+            total, within = 0.0, True
+            for leg in data["departures"]:
+                out = cheapest(fares["outbound"], leg["airport"], iata, out_day)
+                back = cheapest(fares["return"], iata, leg["airport"], back_day)
+                if out is None or back is None:
+                    total = None
+                    break
+                total += out + back
+                within = within and out + back <= leg["budget"]
+            days.append({
+                "outbound_date": out_day.isoformat(),
+                "return_date": back_day.isoformat(),
+                "total_flight_cost": None if total is None else round(total, 2),
+                "within_budget": total is not None and within,
+            })
+    return days
+
+def best_dates(data: Dict[str, Any], calendar: List[Dict[str, Any]]) -> Tuple[date, date]:
+    """
+    The cheapest date pair in `calendar`, preferring pairs every member can
+    afford and, on equal cost, the ones closest to the requested dates. Falls
+    back to the requested dates when nothing is priced.
+    """
+    def shift(day: Dict[str, Any]) -> int:
+        return (abs((date.fromisoformat(day["outbound_date"]) - data["start_date"]).days)
+                + abs((date.fromisoformat(day["return_date"]) - data["end_date"]).days))
+
+    priced = [d for d in calendar if d["total_flight_cost"] is not None]
+    if not priced:
+        return data["start_date"], data["end_date"]
+    best = min(priced, key=lambda d: (not d["within_budget"], d["total_flight_cost"], shift(d)))
+    return date.fromisoformat(best["outbound_date"]), date.fromisoformat(best["return_date"])
+
+def plan_calendar(data: Dict[str, Any], candidates: List[Dict[str, Any]],
+                  fares: Optional[Dict[str, FareMatrix]]) -> Tuple[List[Tuple[date, date]], List[Dict[str, Any]]]:
+    """
+    (travel dates per candidate, calendar entries for the response).
+
+    Without flexible dates or fares every candidate keeps the requested dates
+    and the calendar is empty.
+    """
+    requested = (data["start_date"], data["end_date"])
+    if not data.get("flex_days") or fares is None:
+        return [requested] * len(candidates), []
+    dates, calendar = [], []
+    for c in candidates:
+        days = build_calendar(data, c["iata"], fares)
+        start, end = best_dates(data, days)
+        dates.append((start, end))
+        calendar.append({
+            "city": c["city"],
+            "iata": c["iata"],
+            "outbound_date": start.isoformat(),
+            "return_date": end.isoformat(),
+            "days": days,
+        })
+    return dates, calendar
@@ -0,0 +1,44 @@
+import asyncio
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+from agent_helpers import call_mcp_tool
+
+# {origin: {destination: {YYYY-MM-DD: {"complete", "total", "itineraries"} | None}}}
+FareMatrix = Dict[str, Dict[str, Dict[str, Optional[Dict[str, Any]]]]]
+
+async def fetch_fare_matrix(origins: List[str], destinations: List[str], dates: List[date], top_k: int = 1) -> FareMatrix:
+    """One search_live_prices_batch call over origins × destinations × dates, cheapest first."""
+    result = await call_mcp_tool("search_live_prices_batch", {
+        "originPlaces": sorted(set(origins)),
+        "destinationPlaces": sorted(set(destinations)),
+        "outboundDates": sorted({d.isoformat() for d in dates}),
+        "top_k": top_k,
+        "sort_by": "cheapest",
+    })
+    return (result or {}).get("matrix", {})
+
+def date_window(day: date, flex_days: int = 0) -> List[date]:
+    """`day` and the `flex_days` days either side of it, in order."""
+    return [day + timedelta(days=k) for k in range(-flex_days, flex_days + 1)]
+
+async def fetch_round_trip_fares(origins: List[str], destinations: List[str], start: date, end: date,
+                                 top_k: int = 1, flex_days: int = 0) -> Dict[str, FareMatrix]:
+    """
+    Outbound (origins -> destinations on `start`) and return (destinations ->
+    origins on `end`) fare matrices, fetched concurrently. With `flex_days`
+    each side covers every day within ±flex_days of its date.
+    """
+    outbound, inbound = await asyncio.gather(
+        fetch_fare_matrix(origins, destinations, date_window(start, flex_days), top_k),
+        fetch_fare_matrix(destinations, origins, date_window(end, flex_days), top_k),
+    )
+    return {"outbound": outbound, "return": inbound}
+
+def options(matrix: FareMatrix, origin: str, destination: str, day: date) -> List[Dict[str, Any]]:
+    """Itineraries for one leg (cheapest first), empty when unknown."""
+    quote = matrix.get(origin.upper(), {}).get(destination.upper(), {}).get(day.isoformat())
+    return (quote or {}).get("itineraries") or []
+
+def cheapest(matrix: FareMatrix, origin: str, destination: str, day: date) -> Optional[float]:
+    legs = options(matrix, origin, destination, day)
+    return legs[0]["price"] if legs else None
@@ -0,0 +1,96 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+from fares import FareMatrix, options
+
+# members' outbound flights must land within this many hours of each other
+ARRIVAL_WINDOW_HOURS = float(os.environ.get("ARRIVAL_WINDOW_HOURS", "6"))
+# cheapest options per leg considered; bounds the search for large groups
+OPTIMIZER_MAX_OPTIONS = int(os.environ.get("OPTIMIZER_MAX_OPTIONS", "10"))
+
+def _arrival(itinerary: Dict[str, Any]) -> Optional[float]:
+    if not itinerary.get("arrive"):
+        return None
+    return datetime.fromisoformat(itinerary["arrive"]).timestamp()
+
+def _leg(itinerary: Dict[str, Any]) -> Dict[str, Any]:
+    date, _, time = (itinerary.get("depart") or "").partition("T")
+    return {
+        "date": date,
+        "time": time,
+        "price": itinerary["price"],
+        "booking_link": itinerary.get("deep_link"),
+        "airline": itinerary.get("carrier"),
+        "flight_no": "/".join(itinerary.get("flight_numbers") or []),
+    }
+
+def optimize_group(data: Dict[str, Any], iata: str, fares: Dict[str, FareMatrix],
+                   window_hours: float = ARRIVAL_WINDOW_HOURS,
+                   max_options: int = OPTIMIZER_MAX_OPTIONS) -> Optional[Dict[str, Any]]:
+    """
+    Pick one outbound and one return flight per member for a candidate city.
+
+    Minimises the group's total fare subject to each member's budget and to all
+    outbound flights arriving within `window_hours` of each other. Returns always
+    come back to the member's own airport, so each member simply takes their
+    cheapest return; the coupling between members is only through arrival times.
+
+    The search tries each candidate arrival as the start of the window and, for
+    each member, takes the cheapest affordable outbound landing inside it. That
+    is at most members × options window starts, each one linear pass over the
+    options, instead of the options^members brute force.
+
+    Returns:
+        {"flights": [...], "totals": {"total_flight_cost"}} in the plan schema, or
+        None when some member has no priced flights or no combination fits.
+    """
+    members = []
+    for dep in data["departures"]:
+        outs = options(fares["outbound"], dep["airport"], iata, data["start_date"])[:max_options]
+        backs = options(fares["return"], iata, dep["airport"], data["end_date"])[:max_options]
+        if not outs or not backs:
+            return None
+        back = min(backs, key=lambda i: i["price"])
+        # (round-trip cost, arrival timestamp, outbound) for affordable outbounds, cheapest first
+        choices = sorted(
+            ((o["price"] + back["price"], _arrival(o), o) for o in outs
+             if o["price"] + back["price"] <= dep["budget"]),
+            key=lambda c: c[0],
+        )
+        if not choices:
+            return None
+        members.append((dep, back, choices))
+
+    window = window_hours * 3600
+    anchors = sorted({c[1] for _, _, choices in members for c in choices if c[1] is not None}) or [None]
+    best_total, best_pick = None, None
+    for start in anchors:
+        pick, total = [], 0.0
+        for _, _, choices in members:
+            # choices are sorted by cost, so the first one landing in the window is the cheapest
+            hit = next(
+                (c for c in choices
+                 if start is None or c[1] is None or start <= c[1] <= start + window),
+                None,
+            )
+            if hit is None:
+                break
+            pick.append(hit)
+            total += hit[0]
+        else:
+            if best_total is None or total < best_total:
+                best_total, best_pick = total, pick
+    if best_pick is None:
+        return None
+
+    flights = []
+    for (dep, back, _), (_, _, out) in zip(members, best_pick):
+        outbound = _leg(out)
+        flights.append({
+            "departure_airport": dep["airport"],
+            "airline": outbound["airline"],
+            "flight_no": outbound["flight_no"],
+            "outbound": outbound,
+            "return": _leg(back),
+        })
+    return {"flights": flights, "totals": {"total_flight_cost": round(best_total, 2)}}
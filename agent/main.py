@@ -6,66 +6,77 @@ import shutil
 import subprocess
 import time
 from typing import Any
+import httpx
 from agents import Agent, Runner
-from agents.mcp import MCPServer, MCPServerSse
+from agents.mcp import MCPServer
 from agents.model_settings import ModelSettings
 from dotenv import load_dotenv
-from agents import set_default_openai_key
-from flask import Flask, request
 
-app = Flask(__name__)
+load_dotenv()
+from agent_helpers import MCP_POOL, MCP_SERVER_PATH, MCP_SSE_URL, MCP_TRANSPORT, MODEL_NAME
+
+# how long to wait for a spawned SSE server to answer its health check
+MCP_READY_TIMEOUT = float(os.environ.get("MCP_READY_TIMEOUT", "30"))
 
 async def run(mcp_server: MCPServer):
-    load_dotenv()
-    api_key = os.environ.get("OPENAI_API_KEY")
-    set_default_openai_key(api_key)
     agent = Agent(
-        model="gpt-4.1-2025-04-14",
+        model=MODEL_NAME,
         name="Assistant",
         instructions="Use the tools to help planning out user's trip",
         mcp_servers=[mcp_server],
         model_settings=ModelSettings(tool_choice="required"),
     )
-    
+
     message = "I am leaving from the London Gatwick Airport and will travel to Barcelona between July 7th 2025 and July 10th 2025. What would be the return ticket price for that? Recommend me some locations to stay as well my budget is under £800"
     print(f"Running: {message}")
     result = await Runner.run(starting_agent=agent, input=message)
     print(result.final_output)
-    
+
 async def main():
-    async with MCPServerSse(
-        name="Python SSE Server",
-        params={
-            "url": "http://localhost:8000/sse",
-        },
-        client_session_timeout_seconds=30,
-    ) as server:
-        await run(server)
-            
+    # MCP_TRANSPORT=inprocess or stdio needs no server process of its own
+    try:
+        async with MCP_POOL.session() as s:
+            await run(s.server)
+    finally:
+        await MCP_POOL.close()
+
+def wait_until_ready(process: subprocess.Popen, sse_url: str, timeout: float = MCP_READY_TIMEOUT):
+    """Block until the SSE server answers GET /healthz, failing fast if it exits first."""
+    health_url = sse_url.rsplit("/sse", 1)[0] + "/healthz"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            if httpx.get(health_url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError(f"no answer from {health_url} after {timeout:.0f}s")
+
 if __name__ == "__main__":
-    if not shutil.which("uv"):
-        raise RuntimeError(
-            "uv is not installed"
-        )
-        
     process: subprocess.Popen[Any] | None = None
-    
-    try:
-        this_dir = os.path.dirname(os.path.abspath(__file__))
-        server_file = os.path.join(this_dir, "server.py")
-        print("Starting SSE Server at http://localhost:8000/sse ...")
-        
-        process = subprocess.Popen(["uv", "run", server_file])
-        
-        time.sleep(3)
-        
-        print("SSE server started. Running example... \n\n")
-    except Exception as e:
-        print(f"Error starting SSE server: {e}")
-        exit(1)
-        
+
+    if MCP_TRANSPORT == "sse":
+        if not shutil.which("uv"):
+            raise RuntimeError(
+                "uv is not installed"
+            )
+
+        try:
+            print(f"Starting SSE Server at {MCP_SSE_URL} ...")
+            process = subprocess.Popen(["uv", "run", MCP_SERVER_PATH])
+            wait_until_ready(process, MCP_SSE_URL)
+            print("SSE server started. Running example... \n\n")
+        except Exception as e:
+            print(f"Error starting SSE server: {e}")
+            if process:
+                process.terminate()
+            exit(1)
+
     try:
         asyncio.run(main())
     finally:
         if process:
-            process.terminate()    
\ No newline at end of file
+            process.terminate()
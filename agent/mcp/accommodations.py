@@ -0,0 +1,151 @@
+import asyncio
+import os
+import time
+from typing import Dict, Any, List, Optional
+from dotenv import load_dotenv
+from ttl_cache import TTLCache, SQLiteStore
+
+load_dotenv()
+
+AIRBNB_API_KEY = os.environ.get("AIRBNB_API_KEY")
+AIRBNB_ACTOR_ID = os.environ.get("AIRBNB_ACTOR_ID", "NDa1latMI7JHJzSYU")
+ACCOMMODATION_CACHE_TTL = float(os.environ.get("ACCOMMODATION_CACHE_TTL", "21600"))
+ACCOMMODATION_CACHE_SIZE = int(os.environ.get("ACCOMMODATION_CACHE_SIZE", "256"))
+ACCOMMODATION_CACHE_PATH = os.environ.get("ACCOMMODATION_CACHE_PATH")
+# a failed search is remembered this long, so lookups do not relaunch a paid run each time
+ACCOMMODATION_FAILURE_TTL = float(os.environ.get("ACCOMMODATION_FAILURE_TTL", "300"))
+# each wait is a server-side long poll, so a finished run is noticed at once
+ACCOMMODATION_POLL_SECONDS = int(os.environ.get("ACCOMMODATION_POLL_SECONDS", "5"))
+ACCOMMODATION_RUN_TIMEOUT = float(os.environ.get("ACCOMMODATION_RUN_TIMEOUT", "180"))
+ACCOMMODATION_MAX_LISTINGS = int(os.environ.get("ACCOMMODATION_MAX_LISTINGS", "50"))
+
+TERMINAL_STATUSES = {"SUCCEEDED", "FAILED", "TIMED_OUT", "ABORTED"}
+
+def _failure(error: str) -> Dict[str, Any]:
+    return {"status": "failed", "complete": False, "total": 0, "listings": [], "error": error}
+
+# listing fields that make up most of a dataset item and that no plan needs
+_HEAVY_FIELDS = ("images", "photos", "reviews", "amenities", "description", "sectionedDescription", "htmlDescription")
+
+def _compact(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in item.items() if k not in _HEAVY_FIELDS}
+
+class AccommodationSearches:
+    """
+    Airbnb searches run as background Apify actor runs.
+
+    prefetch() starts a run and returns at once. The run is then long-polled and
+    its dataset read page by page while it fills, so lookup() can hand out the
+    listings found so far. Finished results are cached per (location, dates,
+    guests, price cap, 0 for none); concurrent prefetches of the same search
+    share one run. A search that fails is cached as failed for
+    ACCOMMODATION_FAILURE_TTL, and not retried until then.
+    """
+
+    def __init__(self, api_key: Optional[str] = AIRBNB_API_KEY, actor_id: str = AIRBNB_ACTOR_ID,
+                 ttl: float = ACCOMMODATION_CACHE_TTL, maxsize: int = ACCOMMODATION_CACHE_SIZE):
+        self.api_key = api_key
+        self.actor_id = actor_id
+        self.cache = TTLCache(
+            maxsize=maxsize,
+            ttl=ttl,
+            store=SQLiteStore(ACCOMMODATION_CACHE_PATH, table="accommodations") if ACCOMMODATION_CACHE_PATH else None,
+        )
+        self._client = None
+        # running searches: key -> {"task", "listings" so far}
+        self._running: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.api_key)
+
+    def _apify(self):
+        if self._client is None:
+            from apify_client import ApifyClientAsync
+            self._client = ApifyClientAsync(self.api_key)
+        return self._client
+
+    @staticmethod
+    def key(location: str, checkin_date: str, checkout_date: str, num_adults: int, priceMax: int = 0) -> str:
+        return f"{location.strip().lower()}:{checkin_date}:{checkout_date}:{int(num_adults)}:{int(priceMax)}"
+
+    def prefetch(self, location: str, checkin_date: str, checkout_date: str, num_adults: int, priceMax: int = 0) -> str:
+        """
+        Start the search in the background unless it is cached, recently failed or
+        running; returns which of the four it was.
+        """
+        key = self.key(location, checkin_date, checkout_date, num_adults, priceMax)
+        if key in self._running:
+            return "running"
+        cached = self.cache.get(key)
+        if cached is not None:
+            return "failed" if cached.get("error") else "cached"
+        run_input = {
+            "locationQueries": [location],
+            "checkIn": checkin_date,
+            "checkOut": checkout_date,
+            "currency": "GBP",
+            "adults": num_adults,
+        }
+        if priceMax > 0:
+            run_input["priceMax"] = priceMax
+        state: Dict[str, Any] = {"listings": []}
+        state["task"] = asyncio.ensure_future(self._search(key, run_input, state))
+        self._running[key] = state
+        return "started"
+
+    async def _search(self, key: str, run_input: Dict[str, Any], state: Dict[str, Any]):
+        listings: List[Dict[str, Any]] = state["listings"]
+        status = None
+        try:
+            client = self._apify()
+            run = await client.actor(self.actor_id).start(run_input=run_input)
+            dataset = client.dataset(run["defaultDatasetId"])
+            deadline = time.monotonic() + ACCOMMODATION_RUN_TIMEOUT
+            while True:
+                run = await client.run(run["id"]).wait_for_finish(wait_secs=ACCOMMODATION_POLL_SECONDS) or run
+                status = run.get("status")
+                # read only what was added since the last page
+                remaining = ACCOMMODATION_MAX_LISTINGS - len(listings)
+                if remaining > 0:
+                    page = await dataset.list_items(offset=len(listings), limit=remaining)
+                    listings.extend(_compact(item) for item in page.items)
+                if status in TERMINAL_STATUSES:
+                    break
+                if len(listings) >= ACCOMMODATION_MAX_LISTINGS or time.monotonic() > deadline:
+                    # enough listings (or too slow): stop paying for the run
+                    await client.run(run["id"]).abort()
+                    break
+            if status in TERMINAL_STATUSES and status != "SUCCEEDED" and not listings:
+                raise RuntimeError(f"actor run ended {status}")
+            self.cache.set(key, {"complete": status == "SUCCEEDED", "listings": listings})
+        except Exception as e:
+            print(f"Accommodation search {key} failed: {e!r}")
+            self.cache.set(key, {"complete": False, "listings": [], "error": repr(e)}, ttl=ACCOMMODATION_FAILURE_TTL)
+        finally:
+            self._running.pop(key, None)
+
+    def lookup(self, location: str, checkin_date: str, checkout_date: str, num_adults: int, priceMax: int = 0,
+               top_k: int = 10) -> Dict[str, Any]:
+        """
+        Listings for a search without waiting: "ready" from the cache, "pending" with
+        the listings found so far, "failed" (with the error) or "not_started".
+        """
+        key = self.key(location, checkin_date, checkout_date, num_adults, priceMax)
+        cached = self.cache.get(key)
+        if cached is not None and cached.get("error"):
+            return _failure(cached["error"])
+        if cached is not None:
+            return {"status": "ready", "complete": cached["complete"], "total": len(cached["listings"]),
+                    "listings": cached["listings"][:max(top_k, 0)]}
+        state = self._running.get(key)
+        if state is not None:
+            return {"status": "pending", "complete": False, "total": len(state["listings"]),
+                    "listings": state["listings"][:max(top_k, 0)]}
+        return {"status": "not_started", "complete": False, "total": 0, "listings": []}
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "running": len(self._running)}
+
+
+ACCOMMODATIONS = AccommodationSearches()
@@ -0,0 +1,98 @@
+from typing import Dict, Any, List, Optional
+from live_prices import RESULT_STATUS_COMPLETE
+
+_PRICE_DIVISORS: Dict[str, int] = {
+    "PRICE_UNIT_WHOLE": 1,
+    "PRICE_UNIT_CENTI": 100,
+    "PRICE_UNIT_MILLI": 1000,
+    "PRICE_UNIT_MICRO": 1000000,
+}
+
+SORT_KEYS = {
+    "cheapest": lambda i: (i["price"], i["duration_min"] or 0),
+    "fastest": lambda i: (i["duration_min"] or 0, i["price"]),
+    "best": lambda i: (-(i["score"] or 0), i["price"]),
+}
+
+def _price(price: Optional[Dict[str, Any]]) -> Optional[float]:
+    if not price or price.get("amount") in (None, ""):
+        return None
+    return round(int(price["amount"]) / _PRICE_DIVISORS.get(price.get("unit"), 1), 2)
+
+def _when(dt: Optional[Dict[str, int]]) -> Optional[str]:
+    if not dt:
+        return None
+    return f"{dt['year']:04d}-{dt['month']:02d}-{dt['day']:02d}T{dt.get('hour', 0):02d}:{dt.get('minute', 0):02d}"
+
+def extract_itineraries(response: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Parse a Skyscanner live-search response into a compact, price-sorted itinerary list.
+
+    Legs, segments, places and carriers are resolved by id against the response's own
+    lookup tables, and only the cheapest pricing option of each itinerary is kept.
+
+    Args:
+        response: the JSON body of a live search create/poll call
+
+    Returns:
+        Dict[str, Any]: {"complete": bool, "itineraries": [...]} where each itinerary has
+        price, carrier, from/to IATA, depart/arrive times, flight numbers, stops and deep link
+    """
+    content = (response or {}).get("content") or {}
+    results = content.get("results") or {}
+    legs = results.get("legs") or {}
+    segments = results.get("segments") or {}
+    places = results.get("places") or {}
+    carriers = results.get("carriers") or {}
+    scores = {
+        s["itineraryId"]: s.get("score")
+        for s in (content.get("sortingOptions") or {}).get("best") or []
+    }
+
+    out: List[Dict[str, Any]] = []
+    for itinerary_id, itinerary in (results.get("itineraries") or {}).items():
+        priced = [
+            (_price(option.get("price")), option)
+            for option in itinerary.get("pricingOptions") or []
+        ]
+        priced = [p for p in priced if p[0] is not None]
+        leg = legs.get((itinerary.get("legIds") or [None])[0])
+        if not priced or not leg:
+            continue
+        price, option = min(priced, key=lambda p: p[0])
+
+        carrier_ids = leg.get("marketingCarrierIds") or []
+        carrier = carriers.get(carrier_ids[0], {}) if carrier_ids else {}
+        flight_numbers = []
+        for segment_id in leg.get("segmentIds") or []:
+            segment = segments.get(segment_id)
+            if segment:
+                code = carriers.get(segment.get("marketingCarrierId"), {}).get("displayCode", "")
+                flight_numbers.append(f"{code}{segment.get('marketingFlightNumber', '')}")
+
+        out.append({
+            "price": price,
+            "carrier": carrier.get("name"),
+            "from": places.get(leg.get("originPlaceId"), {}).get("iata"),
+            "to": places.get(leg.get("destinationPlaceId"), {}).get("iata"),
+            "depart": _when(leg.get("departureDateTime")),
+            "arrive": _when(leg.get("arrivalDateTime")),
+            "duration_min": leg.get("durationInMinutes"),
+            "stops": leg.get("stopCount"),
+            "flight_numbers": flight_numbers,
+            "deep_link": next((item["deepLink"] for item in option.get("items") or [] if item.get("deepLink")), None),
+            "score": scores.get(itinerary_id),
+        })
+
+    out.sort(key=SORT_KEYS["cheapest"])
+    return {
+        "complete": (response or {}).get("status") == RESULT_STATUS_COMPLETE,
+        "itineraries": out,
+    }
+
+def top_itineraries(quote: Dict[str, Any], top_k: int = 5, sort_by: str = "cheapest") -> List[Dict[str, Any]]:
+    """Return the first `top_k` itineraries of an extracted quote ordered by `sort_by`."""
+    if sort_by not in SORT_KEYS:
+        raise ValueError(f"sort_by must be one of {sorted(SORT_KEYS)}, got {sort_by!r}")
+    ranked = sorted(quote["itineraries"], key=SORT_KEYS[sort_by])
+    return [{k: v for k, v in i.items() if k != "score"} for i in ranked[:max(top_k, 0)]]
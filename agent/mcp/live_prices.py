@@ -1,17 +1,146 @@
-import requests
+import asyncio
 import json
 import os
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Optional, AsyncIterator
+import httpx
 from dotenv import load_dotenv
+from scheduler import SKYSCANNER
+from metrics import span
+
+load_dotenv()
+
+SKYSCANNER_API_KEY = os.environ.get("SKYSCANNER_API_KEY")
+SKYSCANNER_BASE_URL = os.environ.get("SKYSCANNER_BASE_URL", "https://partners.api.skyscanner.net/apiservices")
+SKYSCANNER_TIMEOUT = float(os.environ.get("SKYSCANNER_TIMEOUT", "10"))
+SKYSCANNER_POLL_DEADLINE = float(os.environ.get("SKYSCANNER_POLL_DEADLINE", "20"))
+SKYSCANNER_POLL_INTERVAL = float(os.environ.get("SKYSCANNER_POLL_INTERVAL", "1"))
+SKYSCANNER_MAX_CONNECTIONS = int(os.environ.get("SKYSCANNER_MAX_CONNECTIONS", "20"))
+
+RESULT_STATUS_COMPLETE = "RESULT_STATUS_COMPLETE"
+
+class SkyscannerClient:
+    """
+    Async Skyscanner partners API client sharing one pooled, keep-alive HTTP connection pool.
+
+    The underlying httpx.AsyncClient is created lazily so it binds to the event loop
+    that first uses it (the FastMCP server loop).
+    """
+
+    def __init__(self, api_key: Optional[str] = SKYSCANNER_API_KEY, base_url: str = SKYSCANNER_BASE_URL,
+                 timeout: float = SKYSCANNER_TIMEOUT, max_connections: int = SKYSCANNER_MAX_CONNECTIONS):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "x-api-key": self.api_key or "",
+                    "Content-Type": "application/json"
+                },
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def post(self, path: str, payload: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        POST to the partners API.
+
+        Args:
+            path: endpoint path relative to the base URL
+            payload: JSON request body
+            timeout: per-call timeout in seconds, defaults to the client timeout
+
+        Returns:
+            Optional[Dict[str, Any]]: The JSON response from the API or None if the request fails
+        """
+        try:
+            # 429s are retried by the scheduler after Retry-After; anything else lands below
+            return await SKYSCANNER.call(self._send, path, payload, timeout or self.timeout)
+
+        except httpx.HTTPStatusError as e:
+            print(f"HTTP Error: {e}")
+            print(f"Response: {e.response.text}")
+        except httpx.ConnectError as e:
+            print(f"Connection Error: {e}")
+        except httpx.TimeoutException as e:
+            print(f"Timeout Error: {e}")
+        except httpx.HTTPError as e:
+            print(f"Request Exception: {e}")
+
+        return None
+
+    async def _send(self, path: str, payload: Optional[Dict[str, Any]], timeout: float) -> Dict[str, Any]:
+        endpoint = "poll" if "/poll/" in path else path.rstrip("/").rsplit("/", 1)[-1]
+        with span("skyscanner_http", endpoint=endpoint):
+            response = await self._http().post(path, json=payload, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+
+    async def stream_flights(self, query: Dict[str, Any], deadline: float = SKYSCANNER_POLL_DEADLINE) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run a live flight search and yield each incremental response.
+
+        Creates the search session, then polls it until Skyscanner reports the
+        results complete or `deadline` seconds have passed. Every poll response
+        carries the full result set known so far, so the last one yielded is
+        the most complete.
+
+        Args:
+            query: the `query` object of the live search create request
+            deadline: seconds to keep polling before giving up on completion
+        """
+        started = time.monotonic()
+        response = await self.post("/v3/flights/live/search/create", {"query": query})
+        if response is None:
+            return
+        yield response
+
+        while response.get("status") != RESULT_STATUS_COMPLETE and response.get("sessionToken"):
+            remaining = deadline - (time.monotonic() - started)
+            if remaining <= SKYSCANNER_POLL_INTERVAL:
+                return
+            await asyncio.sleep(SKYSCANNER_POLL_INTERVAL)
+            polled = await self.post(
+                f"/v3/flights/live/search/poll/{response['sessionToken']}",
+                timeout=min(self.timeout, remaining - SKYSCANNER_POLL_INTERVAL),
+            )
+            if polled is None:
+                return
+            response = polled
+            yield response
+
+    async def search_flights(self, query: Dict[str, Any], deadline: float = SKYSCANNER_POLL_DEADLINE) -> Optional[Dict[str, Any]]:
+        """Run a live flight search to completion (or deadline) and return the last response."""
+        last = None
+        async for last in self.stream_flights(query, deadline):
+            pass
+        return last
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+CLIENT = SkyscannerClient()
 
 def get_coordinate(address: str):
-    load_dotenv()
     outputFormat = "json"
     parameters = address
     api_key = os.environ.get("GOOGLE_MAPS")
     req = f"https://maps.googleapis.com/maps/api/geocode/{outputFormat}?{parameters}&key={api_key}"
 
-def car_hire_live_prices(destinationPlace: str, pickupyear: int, pickupmonth: int, pickupday: int, dropoffyear: int, dropoffmonth: int, dropoffday: int) -> Optional[Dict[str, Any]]:
+async def car_hire_live_prices(destinationPlace: str, pickupyear: int, pickupmonth: int, pickupday: int, dropoffyear: int, dropoffmonth: int, dropoffday: int) -> Optional[Dict[str, Any]]:
     """
     Initiates a car hire search session with the Skyscanner API to retrieve live car hire live prices.
 
@@ -23,21 +152,10 @@ def car_hire_live_prices(destinationPlace: str, pickupyear: int, pickupmonth: in
         dropoffyear: dropoff year of the car hire
         dropoffmonth: dropoff month of the car hire
         dropoffday: dropoff day of the car hire
-    
+
     Returns:
         Optional[Dict[str, Any]]: The JSON response from the API or None if the request fails
     """
-    # API endpoint
-    load_dotenv()
-    api_key = os.environ.get("SKYSCANNER_API_KEY")
-    url: str = "https://partners.api.skyscanner.net/apiservices/v1/carhire/live/search/create"
-
-    # Headers
-    headers: Dict[str, str] = {
-        "x-api-key": api_key,
-        "Content-Type": "application/json"
-    }
-
     # Request payload
     payload: Dict[str, Any] = {
         "query": {
@@ -45,37 +163,21 @@ def car_hire_live_prices(destinationPlace: str, pickupyear: int, pickupmonth: in
             "locale": "en-GB",
             "currency": "GBP",
             "pickUpDate": {
-                
+
             },
             "adults": 1,
             "cabin_class": "CABIN_CLASS_ECONOMY"
         }
     }
 
-    try:
-        # Make the POST request
-        response: requests.Response = requests.post(url, headers=headers, json=payload)
-
-        # Check if the request was successful
-        response.raise_for_status()
-        results = response.json()
-        # print(json.dumps(results, indent=4))
-        return results
-
-    except requests.exceptions.HTTPError as e:
-        print(f"HTTP Error: {e}")
-        print(f"Response: {response.text if 'response' in locals() else 'No response'}")
-    except requests.exceptions.ConnectionError as e:
-        print(f"Connection Error: {e}")
-    except requests.exceptions.Timeout as e:
-        print(f"Timeout Error: {e}")
-    except requests.exceptions.RequestException as e:
-        print(f"Request Exception: {e}")
-
-    return None
-def create_search_session(originPlace: str, destinationPlace: str, outboundYear: int, outboundMonth: int, outboundDay: int) -> Optional[Dict[str, Any]]:
+    return await CLIENT.post("/v1/carhire/live/search/create", payload)
+
+async def create_search_session(originPlace: str, destinationPlace: str, outboundYear: int, outboundMonth: int, outboundDay: int) -> Optional[Dict[str, Any]]:
     """
-    Initiates a flight search session with the Skyscanner API to retrieve live ticket prices.
+    Runs a flight live search with the Skyscanner API to retrieve live ticket prices.
+
+    The session is created and then polled until the results are complete or
+    SKYSCANNER_POLL_DEADLINE seconds have passed.
 
     Args:
         originPlace: Place where the user is flying from
@@ -83,66 +185,32 @@ def create_search_session(originPlace: str, destinationPlace: str, outboundYear:
         outboundYear: outbound year of the trip
         outboundMonth: outbound month of the trip
         outboundDay: outbound day of the trip
-    
+
     Returns:
         Optional[Dict[str, Any]]: The JSON response from the API or None if the request fails
     """
-    # API endpoint
-    load_dotenv()
-    api_key = os.environ.get("SKYSCANNER_API_KEY")
-    url: str = "https://partners.api.skyscanner.net/apiservices/v3/flights/live/search/create"
-
-    # Headers
-    headers: Dict[str, str] = {
-        "x-api-key": api_key,
-        "Content-Type": "application/json"
-    }
-
-    # Request payload
-    payload: Dict[str, Any] = {
-        "query": {
-            "market": "UK",
-            "locale": "en-GB",
-            "currency": "GBP",
-            "queryLegs": [
-                {
-                    "origin_place_id": {
-                        "iata": originPlace
-                    },
-                    "destination_place_id": {
-                        "iata": destinationPlace
-                    },
-                    "date": {
-                        "year": outboundYear,
-                        "month": outboundMonth,
-                        "day": outboundDay
-                    }
-                    
+    query: Dict[str, Any] = {
+        "market": "UK",
+        "locale": "en-GB",
+        "currency": "GBP",
+        "queryLegs": [
+            {
+                "origin_place_id": {
+                    "iata": originPlace
+                },
+                "destination_place_id": {
+                    "iata": destinationPlace
+                },
+                "date": {
+                    "year": outboundYear,
+                    "month": outboundMonth,
+                    "day": outboundDay
                 }
-            ],
-            "adults": 1,
-            "cabin_class": "CABIN_CLASS_ECONOMY"
-        }
+
+            }
+        ],
+        "adults": 1,
+        "cabin_class": "CABIN_CLASS_ECONOMY"
     }
 
-    try:
-        # Make the POST request
-        response: requests.Response = requests.post(url, headers=headers, json=payload)
-
-        # Check if the request was successful
-        response.raise_for_status()
-        results = response.json()
-        # print(json.dumps(results, indent=4))
-        return results
-
-    except requests.exceptions.HTTPError as e:
-        print(f"HTTP Error: {e}")
-        print(f"Response: {response.text if 'response' in locals() else 'No response'}")
-    except requests.exceptions.ConnectionError as e:
-        print(f"Connection Error: {e}")
-    except requests.exceptions.Timeout as e:
-        print(f"Timeout Error: {e}")
-    except requests.exceptions.RequestException as e:
-        print(f"Request Exception: {e}")
-
-    return None
\ No newline at end of file
+    return await CLIENT.search_flights(query)
@@ -2,19 +2,103 @@ import requests
 import json
 import os
 import argparse
+import asyncio
 import sys
-from typing import Dict, Any, Optional
+from datetime import date
+from typing import Dict, Any, List, Optional
+import anyio
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
+from mcp.server.stdio import stdio_server
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+# shared helpers (ttl_cache, scheduler, ...) live one level up, in agent/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ttl_cache import TTLCache, SQLiteStore
+from scheduler import SKYSCANNER
+import metrics
 from live_prices import create_search_session
-# from airbnb_scraper import airbnb_scraper
+from itineraries import extract_itineraries, top_itineraries
+from accommodations import ACCOMMODATIONS
 
 load_dotenv()
 
+QUOTE_CACHE_TTL = float(os.environ.get("QUOTE_CACHE_TTL", "900"))
+QUOTE_CACHE_SIZE = int(os.environ.get("QUOTE_CACHE_SIZE", "512"))
+# quotes cut off at SKYSCANNER_POLL_DEADLINE hold only part of the itineraries,
+# so they are kept just long enough to absorb a burst of identical lookups
+PARTIAL_QUOTE_TTL = float(os.environ.get("PARTIAL_QUOTE_TTL", "60"))
+QUOTE_CACHE_PATH = os.environ.get("QUOTE_CACHE_PATH")
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+
+QUOTE_CACHE = TTLCache(
+    maxsize=QUOTE_CACHE_SIZE,
+    ttl=QUOTE_CACHE_TTL,
+    store=SQLiteStore(QUOTE_CACHE_PATH, table="itineraries") if QUOTE_CACHE_PATH else None,
+)
+
+# live searches currently running, so identical concurrent lookups share one
+_INFLIGHT: Dict[str, asyncio.Task] = {}
+
 mcp = FastMCP("SweetSpot MCP Server")
 
+def _quote_key(originPlace: str, destinationPlace: str, outboundYear: int, outboundMonth: int, outboundDay: int) -> str:
+    return f"{originPlace.upper()}:{destinationPlace.upper()}:{outboundYear:04d}-{outboundMonth:02d}-{outboundDay:02d}"
+
+async def _fetch_quote(key: str, originPlace: str, destinationPlace: str, outboundYear: int, outboundMonth: int, outboundDay: int) -> Optional[Dict[str, Any]]:
+    try:
+        response = await create_search_session(originPlace, destinationPlace, outboundYear, outboundMonth, outboundDay)
+        if response is None:
+            return None
+        # cache the compact form only; raw live-search payloads run to megabytes
+        quote = extract_itineraries(response)
+        QUOTE_CACHE.set(key, quote, ttl=None if quote["complete"] else PARTIAL_QUOTE_TTL)
+        return quote
+    finally:
+        _INFLIGHT.pop(key, None)
+
+async def lookup_quote(originPlace: str, destinationPlace: str, outboundYear: int, outboundMonth: int, outboundDay: int) -> Optional[Dict[str, Any]]:
+    """Return the extracted quote for a leg from cache, or run (or join) its live search."""
+    key = _quote_key(originPlace, destinationPlace, outboundYear, outboundMonth, outboundDay)
+    quote = QUOTE_CACHE.get(key)
+    if quote is not None:
+        return quote
+    task = _INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_quote(key, originPlace, destinationPlace, outboundYear, outboundMonth, outboundDay))
+        _INFLIGHT[key] = task
+    # shield so one cancelled caller does not abort the search for the others
+    return await asyncio.shield(task)
+
+def _shape(quote: Optional[Dict[str, Any]], top_k: int, sort_by: str) -> Optional[Dict[str, Any]]:
+    if quote is None:
+        return None
+    return {
+        "complete": quote["complete"],
+        "total": len(quote["itineraries"]),
+        "itineraries": top_itineraries(quote, top_k, sort_by),
+    }
+
+@mcp.custom_route("/healthz", methods=["GET"])
+async def healthz(request: Request) -> JSONResponse:
+    # answers once the server is accepting connections; main.py waits on it
+    return JSONResponse({"status": "ok"})
+
+@mcp.custom_route("/cache-stats", methods=["GET"])
+async def cache_stats(request: Request) -> JSONResponse:
+    return JSONResponse({"quotes": QUOTE_CACHE.stats(), "accommodations": ACCOMMODATIONS.stats(),
+                         "skyscanner": SKYSCANNER.stats()})
+
+metrics.collect("sweetspot_cache", "cache", lambda: {"quotes": QUOTE_CACHE.stats(), "accommodations": ACCOMMODATIONS.stats()})
+metrics.collect("sweetspot_upstream", "upstream", lambda: {"skyscanner": SKYSCANNER.stats()})
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def prometheus_metrics(request: Request) -> Response:
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @mcp.tool()
-def search_live_prices(originPlace :str, destinationPlace :str, outboundYear :int, outboundMonth :int, outboundDay :int) -> Optional[Dict[str, Any]]:
+async def search_live_prices(originPlace :str, destinationPlace :str, outboundYear :int, outboundMonth :int, outboundDay :int, top_k :int = 5, sort_by :str = "cheapest") -> Optional[Dict[str, Any]]:
     """
     Search for live flight prices using Skyscanner API.
 
@@ -24,30 +108,121 @@ def search_live_prices(originPlace :str, destinationPlace :str, outboundYear :in
         outboundYear: outbound year of the trip
         outboundMonth: outbound month of the trip
         outboundDay: outbound day of the trip
+        top_k: number of itineraries to return
+        sort_by: "cheapest", "fastest" or "best"
     
     Returns:
-        Optional[Dict[str, Any]]: The JSON response from the API or None if the request fails
-    """
-    response = create_search_session(originPlace, destinationPlace, outboundYear, outboundMonth, outboundDay)
-    return response
-
-# @mcp.tool()
-# def scrape_airbnb(location: str, checkin_date: str, checkout_date: str, num_adults: int, priceMax: int) -> Optional[Dict[str, Any]]:
-#     """
-#     Searches for available Airbnb listings in specified locations for given travel dates and number of guests.
-
-#     Args:
-#         location: List of location queries to scrape. E.g. London, Manchester, Birmingham, etc.
-#         checkin_date: check-in date for the airbnb. Visual format only allows YYYY-MM-DD
-#         checkout_date: check-out date for the airbnb. Visual format only allows YYYY-MM-DD
-#         num_adults: number of guests
-#         priceMax: Maximum price of the airbnb
-        
-#     Returns:
-#         Optional[Dict[str, Any]]: A JSON-compatible dictionary containing Airbnb listings and metadata (e.g. prices, locations, availability) if the request is successful. Returns None if the request fails or yields no results.
-#     """   
-#     airbnb_list = airbnb_scraper(location, checkin_date, checkout_date, num_adults, priceMax)
-#     return airbnb_list
-    
+        Optional[Dict[str, Any]]: {"complete", "total", "itineraries"} with the top_k itineraries (price, carrier,
+        from, to, depart, arrive, duration_min, stops, flight_numbers, deep_link) or None if the request fails
+    """
+    quote = await lookup_quote(originPlace, destinationPlace, outboundYear, outboundMonth, outboundDay)
+    return _shape(quote, top_k, sort_by)
+
+@mcp.tool()
+async def search_live_prices_batch(originPlaces: List[str], destinationPlaces: List[str], outboundDates: List[str], top_k: int = 3, sort_by: str = "cheapest") -> Dict[str, Any]:
+    """
+    Search live flight prices for every origin × destination × date combination in one call.
+    Prefer this over repeated search_live_prices calls when checking several airports or dates.
+
+    Args:
+        originPlaces: IATA codes of the airports the travellers fly from
+        destinationPlaces: IATA codes of the airports the travellers fly to
+        outboundDates: departure dates, formatted YYYY-MM-DD
+        top_k: number of itineraries to return per leg
+        sort_by: "cheapest", "fastest" or "best"
+
+    Returns:
+        Dict[str, Any]: {"matrix": {origin: {destination: {date: result}}}} where result is the
+        search_live_prices result for that leg, or None if the lookup failed
+    """
+    legs = sorted({
+        (o.strip().upper(), d.strip().upper(), date.fromisoformat(day.strip()))
+        for o in originPlaces
+        for d in destinationPlaces
+        for day in outboundDates
+        if o.strip().upper() != d.strip().upper()
+    })
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def _one(origin: str, destination: str, day: date):
+        async with limit:
+            return await lookup_quote(origin, destination, day.year, day.month, day.day)
+
+    results = await asyncio.gather(*(_one(*leg) for leg in legs), return_exceptions=True)
+
+    matrix: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for (origin, destination, day), result in zip(legs, results):
+        if isinstance(result, BaseException):
+            print(f"Batch lookup {origin}->{destination} {day} failed: {result}")
+            result = None
+        matrix.setdefault(origin, {}).setdefault(destination, {})[day.isoformat()] = _shape(result, top_k, sort_by)
+    return {"matrix": matrix}
+
+@mcp.tool()
+async def prefetch_accommodations(locations: List[str], checkin_date: str, checkout_date: str, num_adults: int, priceMax: int = 0) -> Dict[str, Any]:
+    """
+    Start Airbnb searches for several locations in the background and return at once.
+    Call search_accommodations later to read the results.
+
+    Args:
+        locations: location queries to search, e.g. London, Manchester, Birmingham
+        checkin_date: check-in date, formatted YYYY-MM-DD
+        checkout_date: check-out date, formatted YYYY-MM-DD
+        num_adults: number of guests
+        priceMax: maximum price of the stay, 0 for no cap; must match the prefetch to find its results
+
+    Returns:
+        Dict[str, Any]: {"searches": {location: "started" | "running" | "cached" | "failed"}}, or
+        {"searches": {}, "disabled": true} when no Apify key is configured
+    """
+    if not ACCOMMODATIONS.enabled:
+        return {"searches": {}, "disabled": True}
+    return {"searches": {
+        location: ACCOMMODATIONS.prefetch(location, checkin_date, checkout_date, num_adults, priceMax)
+        for location in locations
+    }}
+
+@mcp.tool()
+async def search_accommodations(location: str, checkin_date: str, checkout_date: str, num_adults: int, priceMax: int = 0, top_k: int = 10) -> Dict[str, Any]:
+    """
+    Return Airbnb listings for a location and dates instantly, from searches started by
+    prefetch_accommodations. A search that was never started is started now.
+
+    Args:
+        location: location query, e.g. London
+        checkin_date: check-in date, formatted YYYY-MM-DD
+        checkout_date: check-out date, formatted YYYY-MM-DD
+        num_adults: number of guests
+        priceMax: maximum price of the stay, 0 for no cap; must match the prefetch to find its results
+        top_k: number of listings to return
+
+    Returns:
+        Dict[str, Any]: {"status", "complete", "total", "listings"} where status is "ready" (finished
+        search), "pending" (listings found so far, none for a search started by this call),
+        "failed" (the search failed recently, with its "error"; not retried until
+        ACCOMMODATION_FAILURE_TTL passes) or "disabled" (no Apify key configured)
+    """
+    result = ACCOMMODATIONS.lookup(location, checkin_date, checkout_date, num_adults, priceMax, top_k)
+    if result["status"] == "not_started":
+        if not ACCOMMODATIONS.enabled:
+            return dict(result, status="disabled")
+        ACCOMMODATIONS.prefetch(location, checkin_date, checkout_date, num_adults, priceMax)
+        result["status"] = "pending"
+    return result
+
+async def _run_stdio():
+    # the protocol owns the real stdout; the tools' print() diagnostics go to stderr
+    protocol = anyio.wrap_file(os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8"))
+    sys.stdout = sys.stderr
+    async with stdio_server(stdout=protocol) as (read_stream, write_stream):
+        await mcp._mcp_server.run(read_stream, write_stream, mcp._mcp_server.create_initialization_options())
+
 if __name__ == "__main__":
-    mcp.run(transport="sse")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="SweetSpot MCP server")
+    parser.add_argument("--transport", choices=("sse", "stdio"), default="sse",
+                        help="sse serves http://localhost:8000/sse; stdio talks to a parent process (MCP_TRANSPORT=stdio)")
+    args = parser.parse_args()
+    if args.transport == "stdio":
+        anyio.run(_run_stdio)
+    else:
+        mcp.run(transport="sse")
\ No newline at end of file
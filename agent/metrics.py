@@ -0,0 +1,202 @@
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# print every finished span with its trace id, e.g. "[trace 1a2b3c4d] plan/agent_run 8123.4ms"
+TRACE_SPANS = os.environ.get("TRACE_SPANS", "0").lower() in ("1", "true")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _fmt_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, Any] = {}
+        REGISTRY.register(self)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return self._header() + [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, help)
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                for bound, n in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', _fmt_value(bound)))} {n}")
+                lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(total)}")
+                lines.append(f"{self.name}_count{_fmt_labels(key)} {counts[-1]}")
+        return lines
+
+
+# stats fields that only ever grow; everything else numeric is exported as a gauge
+_COUNTER_FIELDS = {
+    "hits", "misses", "evictions", "coalesced", "calls", "throttled",
+    "prompts", "request_tokens", "requests", "input_tokens", "cached_input_tokens", "output_tokens",
+}
+
+class Registry:
+    """
+    Metrics of this process, rendered in the Prometheus text format.
+
+    Besides metric objects, it takes collectors: callables returning
+    {label value: stats dict}, such as the caches' and schedulers' existing
+    stats(), which are exported as `<prefix>_<field>{<label>="..."}`.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Tuple[str, str, Callable[[], Dict[str, Dict[str, Any]]]]] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def collect(self, prefix: str, label: str, source: Callable[[], Dict[str, Dict[str, Any]]]):
+        self._collectors.append((prefix, label, source))
+
+    def _render_collected(self) -> List[str]:
+        series: Dict[str, List[str]] = {}
+        for prefix, label, source in self._collectors:
+            try:
+                rows = source()
+            except Exception as e:
+                print(f"Metrics collector {prefix} failed: {e!r}")
+                continue
+            for value_label, stats in rows.items():
+                for field, value in stats.items():
+                    if isinstance(value, bool) or not isinstance(value, (int, float)):
+                        continue
+                    counter = field in _COUNTER_FIELDS
+                    name = f"{prefix}_{field}_total" if counter else f"{prefix}_{field}"
+                    if name not in series:
+                        series[name] = [f"# TYPE {name} {'counter' if counter else 'gauge'}"]
+                    series[name].append(f"{name}{_fmt_labels(_labels({label: value_label}))} {_fmt_value(value)}")
+        return [line for lines in series.values() for line in lines]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.extend(self._render_collected())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram("sweetspot_stage_seconds", "Duration of pipeline stages")
+STAGE_INFLIGHT = Gauge("sweetspot_stage_inflight", "Pipeline stages currently running")
+STAGE_ERRORS = Counter("sweetspot_stage_errors_total", "Pipeline stages that raised")
+
+# called as listener(stage, labels, seconds, failed) for every finished span
+_LISTENERS: List[Callable[[str, Dict[str, Any], float, bool], None]] = []
+
+def add_listener(listener: Callable[[str, Dict[str, Any], float, bool], None]):
+    """Receive every finished span, e.g. to keep raw latencies for exact percentiles."""
+    _LISTENERS.append(listener)
+
+# (trace id, span path) of the innermost open span in this task
+_TRACE: ContextVar[Optional[Tuple[str, str]]] = ContextVar("trace", default=None)
+
+@contextmanager
+def span(stage: str, **labels):
+    """
+    Time a pipeline stage: records its latency histogram, in-flight gauge and
+    error counter under `stage` (plus any extra labels), and nests it in the
+    current trace for TRACE_SPANS logging. Works in sync and async code.
+    """
+    parent = _TRACE.get()
+    trace_id = parent[0] if parent else uuid.uuid4().hex[:8]
+    path = f"{parent[1]}/{stage}" if parent else stage
+    token = _TRACE.set((trace_id, path))
+    labels = dict(labels, stage=stage)
+    STAGE_INFLIGHT.inc(**labels)
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        STAGE_ERRORS.inc(**labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_INFLIGHT.dec(**labels)
+        STAGE_SECONDS.observe(elapsed, **labels)
+        _TRACE.reset(token)
+        for listener in _LISTENERS:
+            listener(stage, labels, elapsed, failed)
+        if TRACE_SPANS:
+            extra = "".join(f" {k}={v}" for k, v in labels.items() if k != "stage")
+            print(f"[trace {trace_id}] {path}{extra} {elapsed * 1000:.1f}ms{' ERROR' if failed else ''}")
+
+def render() -> str:
+    return REGISTRY.render()
+
+def collect(prefix: str, label: str, source: Callable[[], Dict[str, Dict[str, Any]]]):
+    REGISTRY.collect(prefix, label, source)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
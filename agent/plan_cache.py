@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from ttl_cache import TTLCache
+from MongoDB.cache_store import MongoStore
+
+PLAN_CACHE_TTL = float(os.environ.get("PLAN_CACHE_TTL", "3600"))
+PLAN_CACHE_SIZE = int(os.environ.get("PLAN_CACHE_SIZE", "256"))
+# bump when the plan format or prompts change so stale plans are not served
+PLAN_CACHE_VERSION = 6
+
+def plan_key(data: Dict[str, Any]) -> str:
+    """
+    Canonical hash of a validated trip request.
+
+    Member order, interest order and airport case do not change the key; the
+    Mongo trip id is ignored, so identical groups share one plan.
+    """
+    canonical = {
+        "v": PLAN_CACHE_VERSION,
+        "start_date": str(data["start_date"]),
+        "end_date": str(data["end_date"]),
+        "flex_days": data.get("flex_days", 0),
+        "departures": sorted(
+            [leg["airport"].strip().upper(), leg["budget"]] for leg in data["departures"]
+        ),
+        "interests": sorted(
+            sorted(i.strip().lower() for i in profile["interests"])
+            for profile in data["group_profiles"]
+        ),
+    }
+    blob = json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+class SharedPlan:
+    """
+    One in-flight plan computation whose events are recorded as they arrive,
+    so any number of callers can follow it from the first event, whenever they
+    joined, or just wait for the assembled result.
+    """
+
+    def __init__(self, events: Callable[[], AsyncIterator[Dict[str, Any]]],
+                 finish: Callable[[List[Dict[str, Any]]], Awaitable[Dict[str, Any]]]):
+        self.events: List[Dict[str, Any]] = []
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._run(events, finish))
+
+    async def _run(self, events, finish) -> Dict[str, Any]:
+        try:
+            async for ev in events():
+                self.events.append(ev)
+                self._notify()
+            return await finish(self.events)
+        finally:
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[Dict[str, Any]]:
+        """Every event so far, then each new one until the computation ends (re-raising its error)."""
+        seen = 0
+        while True:
+            while seen < len(self.events):
+                seen += 1
+                yield self.events[seen - 1]
+            if self.task.done():
+                self.task.result()
+                return
+            await self._changed.wait()
+
+    async def result(self) -> Dict[str, Any]:
+        # shield so one caller going away does not cancel the others' result
+        return await asyncio.shield(self.task)
+
+class PlanCache:
+    """
+    Plan results cached in memory and in Mongo (`groupTrips.planCache`, TTL
+    indexed), with single-flight coalescing: concurrent requests for the same
+    key, streamed or not, share one in-flight computation instead of each
+    running the pipeline.
+    """
+
+    def __init__(self, ttl: float = PLAN_CACHE_TTL, maxsize: int = PLAN_CACHE_SIZE):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, store=MongoStore("planCache"))
+        self.coalesced = 0
+        self._inflight: Dict[str, SharedPlan] = {}
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.to_thread(self.cache.get, key)
+        except Exception as e:
+            print(f"Plan cache read failed: {e}")
+            return None
+
+    async def put(self, key: str, result: Dict[str, Any]):
+        try:
+            await asyncio.to_thread(self.cache.set, key, result)
+        except Exception as e:
+            print(f"Plan cache write failed: {e}")
+
+    def shared(
+        self,
+        key: str,
+        events: Callable[[], AsyncIterator[Dict[str, Any]]],
+        assemble: Callable[[List[Dict[str, Any]]], Dict[str, Any]],
+        cache_if: Callable[[Dict[str, Any]], bool] = lambda result: True,
+    ) -> SharedPlan:
+        """
+        The in-flight computation for `key`, started from `events` if there is
+        none. Once its events run out they are assembled into the result, which
+        is stored only when `cache_if(result)` holds.
+        """
+        plan = self._inflight.get(key)
+        if plan is not None:
+            self.coalesced += 1
+            return plan
+
+        async def finish(seen):
+            result = assemble(seen)
+            if cache_if(result):
+                await self.put(key, result)
+            return result
+
+        def forget(_):
+            # finished or failed, later callers start afresh (or hit the cache)
+            if self._inflight.get(key) is plan:
+                del self._inflight[key]
+
+        plan = SharedPlan(events, finish)
+        plan.task.add_done_callback(forget)
+        self._inflight[key] = plan
+        return plan
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "coalesced": self.coalesced, "inflight": len(self._inflight)}
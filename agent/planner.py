@@ -0,0 +1,369 @@
+import asyncio, json, os, time
+from collections import deque
+from datetime import date
+from shortlister import ShortlisterClient
+from agent_helpers import ask_agent, call_mcp_tool
+from plan_cache import PlanCache, plan_key
+from fares import fetch_round_trip_fares
+from budget_filter import prefilter
+from itinerary_optimizer import optimize_group, OPTIMIZER_MAX_OPTIONS
+from fare_calendar import plan_calendar, FLEX_DAYS_MAX
+from destinations import DestinationContent, fallback as destination_fallback
+from prompts import plan_request
+from metrics import span
+
+scl = ShortlisterClient()
+PLAN_CACHE = PlanCache()
+DESTINATIONS = DestinationContent()
+
+# latency budget for one /plan-trip request, shortlist included
+PLAN_DEADLINE_SECONDS = float(os.environ.get("PLAN_DEADLINE_SECONDS", "120"))
+# start a duplicate agent run once a candidate is slower than this percentile
+# of recent runs (0 disables hedging); needs HEDGE_MIN_SAMPLES runs first
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "0.9"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+# recent agent run latencies, for the hedge threshold
+_AGENT_LATENCIES = deque(maxlen=500)
+# skip agent runs for candidates whose cheapest fares already break a member's budget
+BUDGET_PREFILTER = os.environ.get("BUDGET_PREFILTER", "1").lower() in ("1", "true")
+PREFILTER_TIMEOUT_SECONDS = float(os.environ.get("PREFILTER_TIMEOUT_SECONDS", "30"))
+# pick flights in code from the pre-fetched fares instead of running the agent
+GROUP_OPTIMIZER = os.environ.get("GROUP_OPTIMIZER", "1").lower() in ("1", "true")
+# itineraries kept per leg: the optimizer weighs several, the prefilter only the cheapest
+FARE_TOP_K = OPTIMIZER_MAX_OPTIONS if GROUP_OPTIMIZER else 1
+# start the shortlist's Airbnb searches in the MCP server while flights are planned,
+# and add what they found to each plan
+ACCOMMODATION_PREFETCH = os.environ.get("ACCOMMODATION_PREFETCH", "1").lower() in ("1", "true")
+# how long after a candidate starts its plan may wait for the search to finish
+ACCOMMODATION_WAIT_SECONDS = float(os.environ.get("ACCOMMODATION_WAIT_SECONDS", "15"))
+ACCOMMODATION_LOOKUP_SECONDS = float(os.environ.get("ACCOMMODATION_LOOKUP_SECONDS", "2"))
+ACCOMMODATION_TOP_K = int(os.environ.get("ACCOMMODATION_TOP_K", "5"))
+# fire-and-forget tasks, referenced until they finish
+_BACKGROUND = set()
+
+def _parse_iso(d: str) -> date:
+    return date.fromisoformat(d)
+
+def validate_basics(js: dict) -> dict:
+    # top-level required fields
+    if "departures" not in js or "group_profiles" not in js \
+       or "start_date" not in js or "end_date" not in js:
+        raise KeyError("Must include: departures, group_profiles, start_date, end_date")
+
+    # parse dates
+    sd = _parse_iso(js["start_date"])
+    ed = _parse_iso(js["end_date"])
+    if ed <= sd:
+        raise ValueError("'end_date' must be after 'start_date'")
+    js["start_date"], js["end_date"] = sd, ed
+
+    # each departure needs an airport code and budget
+    for leg in js["departures"]:
+        if "airport" not in leg or "budget" not in leg:
+            raise KeyError("Each departure must have 'airport' and 'budget'")
+
+    # optional ±N-day flexible dates
+    js["flex_days"] = min(max(int(js.get("flex_days", 0)), 0), FLEX_DAYS_MAX)
+    return js
+
+
+def _parse_plan(txt: str) -> dict:
+    # raising drops the candidate, so an unreadable reply is never cached or counted as planned
+    try:
+        plan = json.loads(txt)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"unparseable agent reply: {e}") from e
+    if not isinstance(plan, dict):
+        raise ValueError(f"agent reply is not a JSON object: {txt[:200]}")
+    return plan
+
+def _hedge_delay():
+    if HEDGE_PERCENTILE <= 0 or len(_AGENT_LATENCIES) < HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(_AGENT_LATENCIES)
+    return ordered[min(int(HEDGE_PERCENTILE * len(ordered)), len(ordered) - 1)]
+
+async def _timed_ask(prompt: str) -> str:
+    started = time.monotonic()
+    with span("agent_run"):
+        txt = await ask_agent(prompt)
+    _AGENT_LATENCIES.append(time.monotonic() - started)
+    return txt
+
+async def _ask_hedged(prompt: str) -> str:
+    """Run the agent; if it outlives the hedge threshold, race a duplicate run and keep the first to succeed."""
+    runs = [asyncio.ensure_future(_timed_ask(prompt))]
+    try:
+        delay = _hedge_delay()
+        if delay is not None:
+            done, _ = await asyncio.wait(runs, timeout=delay)
+            if not done:
+                runs.append(asyncio.ensure_future(_timed_ask(prompt)))
+        errors = []
+        while runs:
+            done, _ = await asyncio.wait(runs, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                runs.remove(task)
+                if task.exception() is None:
+                    return task.result()
+                errors.append(task.exception())
+        raise errors[0]
+    finally:
+        # the losing run is cancelled, which also releases its MCP session
+        for task in runs:
+            task.cancel()
+
+def needs_fares(data) -> bool:
+    """Whether planning this request uses the fare pre-pass."""
+    return bool(BUDGET_PREFILTER or GROUP_OPTIMIZER or data["flex_days"])
+
+async def _fetch_fares(data, candidates, deadline: float):
+    """Fare matrices for every origin × candidate (× flexible day), or None if not needed or unavailable."""
+    if not needs_fares(data):
+        return None
+    timeout = min(PREFILTER_TIMEOUT_SECONDS, deadline - asyncio.get_running_loop().time())
+    try:
+        with span("fares"):
+            return await asyncio.wait_for(fetch_round_trip_fares(
+                [leg["airport"] for leg in data["departures"]],
+                [c["iata"] for c in candidates],
+                data["start_date"],
+                data["end_date"],
+                top_k=FARE_TOP_K,
+                flex_days=data["flex_days"],
+            ), timeout=max(timeout, 0))
+    except Exception as e:
+        # an unavailable pre-pass should never cost the group its plans;
+        # agents fall back to searching fares themselves
+        print(f"Fare pre-pass skipped: {e!r}")
+        return None
+
+def _stay(common) -> dict:
+    # prefetch and lookup must send identical arguments to meet in the accommodation cache
+    return {
+        "checkin_date": common["start_date"].isoformat(),
+        "checkout_date": common["end_date"].isoformat(),
+        "num_adults": len(common["departures"]),
+    }
+
+async def _prefetch_accommodations(data, candidates, dates):
+    """Start accommodation searches for every candidate on its travel dates; they run on in the MCP server."""
+    by_dates = {}
+    for c, (start, end) in zip(candidates, dates):
+        by_dates.setdefault((start, end), []).append(c["city"])
+    try:
+        with span("accommodation_prefetch"):
+            await asyncio.gather(*(
+                call_mcp_tool("prefetch_accommodations", dict(
+                    _stay(dict(data, start_date=start, end_date=end)), locations=cities,
+                ), stateful=True)
+                for (start, end), cities in by_dates.items()
+            ))
+    except Exception as e:
+        print(f"Accommodation prefetch skipped: {e!r}")
+
+def _start_prefetch(data, candidates, dates):
+    task = asyncio.ensure_future(_prefetch_accommodations(data, candidates, dates))
+    _BACKGROUND.add(task)
+    task.add_done_callback(_BACKGROUND.discard)
+
+async def _accommodations(common, candidate):
+    """
+    The candidate's prefetched listings, polled until its search finishes or
+    ACCOMMODATION_WAIT_SECONDS pass; a pending search returns what it has found.
+    None when accommodation search is not configured.
+    """
+    deadline = time.monotonic() + ACCOMMODATION_WAIT_SECONDS
+    args = dict(_stay(common), location=candidate["city"], top_k=ACCOMMODATION_TOP_K)
+    try:
+        while True:
+            result = await call_mcp_tool("search_accommodations", args, stateful=True)
+            if result["status"] == "disabled":
+                return None
+            if result["status"] != "pending" or time.monotonic() + ACCOMMODATION_LOOKUP_SECONDS > deadline:
+                return result
+            await asyncio.sleep(ACCOMMODATION_LOOKUP_SECONDS)
+    except Exception as e:
+        # flights are the plan; a stay search problem only costs the listings
+        print(f"Accommodations for {candidate['city']} failed: {e!r}")
+        return None
+
+def _prefilter(data, candidates, fares, dates):
+    """(indices of candidates to plan, pruned candidates)."""
+    if not BUDGET_PREFILTER or fares is None:
+        return list(range(len(candidates))), []
+    return prefilter(data, candidates, fares, dates)
+
+async def _destination(candidate) -> dict:
+    try:
+        with span("destination"):
+            return await DESTINATIONS.get(candidate["city"], candidate["iata"])
+    except Exception as e:
+        # a missing blurb should not cost the group its flights
+        print(f"Destination content for {candidate['city']} failed: {e!r}")
+        return destination_fallback(candidate["city"], candidate["iata"])
+
+async def _plan_one(common, candidate, fares) -> dict:
+    """
+    Plan one candidate: flights from the optimizer when the pre-fetched fares
+    allow it, otherwise from the tool-using agent, plus the city's cached
+    destination block and its prefetched accommodations fetched alongside.
+    """
+    with span("candidate"):
+        destination = asyncio.ensure_future(_destination(candidate))
+        stays = asyncio.ensure_future(_accommodations(common, candidate)) if ACCOMMODATION_PREFETCH else None
+        try:
+            itinerary = None
+            if GROUP_OPTIMIZER and fares is not None:
+                with span("optimize"):
+                    itinerary = optimize_group(common, candidate["iata"], fares)
+            if itinerary is None:
+                itinerary = _parse_plan(await _ask_hedged(plan_request(common, candidate["city"])))
+            plan = {"destination": await destination, **itinerary}
+            if stays is not None:
+                plan["accommodations"] = await stays
+            return plan
+        finally:
+            destination.cancel()
+            if stays is not None:
+                stays.cancel()
+
+async def _plan_for_all(commons, candidates, deadline: float, indices=None, fares=None):
+    """
+    Run one agent per candidate (or per candidate in `indices`), with the
+    request `commons[i]` carrying candidate i's travel dates, until `deadline`
+    (loop time), yielding (index, plan, None) in completion order, or
+    (index, None, reason) for a candidate whose run failed or was cancelled at
+    the deadline.
+    """
+    loop = asyncio.get_running_loop()
+    if indices is None:
+        indices = range(len(candidates))
+    pending = {
+        asyncio.ensure_future(_plan_one(commons[i], candidates[i], fares)): i
+        for i in indices
+    }
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                pending, timeout=max(deadline - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                for task, i in list(pending.items()):
+                    task.cancel()
+                    del pending[task]
+                    yield i, None, "deadline exceeded"
+                return
+            for task in done:
+                i = pending.pop(task)
+                if task.exception() is not None:
+                    yield i, None, f"agent failed: {task.exception()}"
+                else:
+                    yield i, task.result(), None
+    finally:
+        # consumer went away (client disconnect)
+        for task in pending:
+            task.cancel()
+
+async def plan_events(data, budget: float = PLAN_DEADLINE_SECONDS, shortlist=None, fares=None):
+    """
+    Yield the shortlist as soon as it is known, then each plan as its agent
+    finishes, within a latency budget of `budget` seconds.
+
+    A `shortlist` or `fares` already resolved elsewhere (batch planning shares
+    them across groups) is used instead of looking it up again.
+    """
+    deadline = asyncio.get_running_loop().time() + budget
+    if shortlist is None:
+        with span("shortlist"):
+            async with asyncio.timeout_at(deadline):
+                shortlist = await scl.get_shortlist(data["group_profiles"])
+    candidates = shortlist["candidates"]
+    if ACCOMMODATION_PREFETCH and not data["flex_days"]:
+        _start_prefetch(data, candidates, [(data["start_date"], data["end_date"])] * len(candidates))
+    yield {"event": "shortlist", "shortlist": candidates}
+    if fares is None:
+        fares = await _fetch_fares(data, candidates, deadline)
+    # with flexible dates each candidate travels on its cheapest date pair
+    dates, calendar = plan_calendar(data, candidates, fares)
+    if ACCOMMODATION_PREFETCH and data["flex_days"]:
+        # flexible stays are only known now
+        _start_prefetch(data, candidates, dates)
+    if calendar:
+        yield {"event": "calendar", "calendar": calendar}
+    indices, pruned = _prefilter(data, candidates, fares, dates)
+    if pruned:
+        yield {"event": "pruned", "pruned": pruned}
+    commons = [dict(data, start_date=start, end_date=end) for start, end in dates]
+    async for i, plan, reason in _plan_for_all(commons, candidates, deadline, indices, fares):
+        if plan is None:
+            yield {"event": "dropped", "index": i, "city": candidates[i]["city"], "reason": reason}
+        else:
+            yield {"event": "plan", "index": i, "city": candidates[i]["city"], "plan": plan}
+
+def assemble(events) -> dict:
+    shortlist, plans, dropped, pruned, calendar = [], {}, [], [], []
+    for ev in events:
+        if ev["event"] == "shortlist":
+            shortlist = ev["shortlist"]
+        elif ev["event"] == "calendar":
+            calendar = ev["calendar"]
+        elif ev["event"] == "pruned":
+            pruned = ev["pruned"]
+        elif ev["event"] == "dropped":
+            dropped.append({"city": ev["city"], "reason": ev["reason"]})
+        else:
+            plans[ev["index"]] = ev["plan"]
+    return {
+        "plans": [plans[i] for i in sorted(plans)],
+        "shortlist": shortlist,
+        "pruned": pruned,
+        "dropped": dropped,
+        "calendar": calendar,
+    }
+
+def _replay(result: dict):
+    """Turn a finished result back into the event sequence that produced it."""
+    yield {"event": "shortlist", "shortlist": result["shortlist"]}
+    cities = [c["city"] for c in result["shortlist"]]
+    if result["calendar"]:
+        yield {"event": "calendar", "calendar": result["calendar"]}
+    if result["pruned"]:
+        yield {"event": "pruned", "pruned": result["pruned"]}
+    skipped = {d["city"] for d in result["dropped"]} | {p["city"] for p in result["pruned"]}
+    planned = [i for i, city in enumerate(cities) if city not in skipped]
+    for i, plan in zip(planned, result["plans"]):
+        yield {"event": "plan", "index": i, "city": cities[i], "plan": plan}
+    for d in result["dropped"]:
+        yield {"event": "dropped", "index": cities.index(d["city"]), "city": d["city"], "reason": d["reason"]}
+
+def cacheable(result: dict) -> bool:
+    # a plan cut short by the deadline or a failed agent should be retried, not served
+    return not result["dropped"]
+
+def _shared_plan(data, shortlist=None, fares=None):
+    # streamed, buffered, queued and batch requests all join the same computation
+    return PLAN_CACHE.shared(
+        plan_key(data),
+        lambda: plan_events(data, shortlist=shortlist, fares=fares),
+        assemble,
+        cache_if=cacheable,
+    )
+
+async def plan_trip(data, refresh: bool = False, shortlist=None, fares=None):
+    if not refresh:
+        result = await PLAN_CACHE.get(plan_key(data))
+        if result is not None:
+            return result
+    return await _shared_plan(data, shortlist, fares).result()
+
+async def cached_plan_events(data, refresh: bool = False):
+    """plan_events, but served from the plan cache or joined to an identical in-flight request when possible."""
+    if not refresh:
+        result = await PLAN_CACHE.get(plan_key(data))
+        if result is not None:
+            for ev in _replay(result):
+                yield ev
+            return
+    async for ev in _shared_plan(data).follow():
+        yield ev
@@ -0,0 +1,212 @@
+import json
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+# Every prompt is split into a static part (instructions and schema, sent as
+# the system/instructions message and never formatted) and a compact JSON user
+# message carrying the per-request values. The static part is then a
+# byte-identical prefix across calls, which the provider's prompt cache can
+# reuse.
+
+PLAN_INSTRUCTIONS = """\
+You are a travel-planning agent. Use the tools to find the group's flights.
+
+The user message is a JSON trip:
+{"city": "<candidate city>", "dates": ["<outbound YYYY-MM-DD>", "<return YYYY-MM-DD>"],
+ "departures": [["<origin IATA>", <budget>], ...]}
+
+Return ONLY a JSON object exactly matching this schema (no markdown):
+
+{
+  "flights": [
+    {
+      "departure_airport": "<IATA>",
+      "airline": "<carrier>",
+      "flight_no": "<code>",
+      "outbound": {
+        "date": "<YYYY-MM-DD>",
+        "time": "<HH:MM>",
+        "price": <number>,
+        "booking_link": "<https://…>"
+      },
+      "return": {
+        "date": "<YYYY-MM-DD>",
+        "time": "<HH:MM>",
+        "price": <number>,
+        "booking_link": "<https://…>"
+      }
+    }
+  ],
+  "totals": {
+    "total_flight_cost": <number>
+  }
+}
+
+Ensure:
+- One flights entry per departure; no fields are omitted.
+- Each flight's return leg comes back to the same origin airport.
+- Sum of all flight prices in `totals.total_flight_cost`.
+- Stay within each origin's budget.
+
+Do NOT wrap in back-ticks or add any extra commentary."""
+
+SHORTLIST_INSTRUCTIONS = """You are **Travel-Planner-AI**, an assistant helping a group
+choose European destinations.
+
+Task
+• Produce a ranked list of 4 European cities/towns that have airports.
+
+Rules
+1. Cities must be in Europe and have an IATA airport code.
+2. Score ↑ when a city matches many of the group's interests. The input maps each
+   interest to the number of group members who share it; weigh shared ones higher.
+3. Return exactly 4 items, ranked by score (break ties alphabetically).
+4. If the input has an "options" list, choose only from those cities and keep
+   their iata codes.
+5. Reply ONLY with minified JSON matching:
+
+{
+"candidates":[
+  {"city":"string","iata":"string","score":number,
+   "matched":["string"]}
+]}"""
+
+DESTINATION_INSTRUCTIONS = """You write short destination overviews for a group travel planner.
+
+Reply ONLY with minified JSON matching:
+
+{"city":"string","country":"string",
+ "summary":"30-60 word engaging overview",
+ "top_highlights":["string","string","string"]}"""
+
+def _compact(value: Any) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+def plan_request(common: Dict[str, Any], city: str) -> str:
+    """User message for one candidate's planning agent run."""
+    return TOKENS.record_prompt("plan", _compact({
+        "city": city,
+        "dates": [common["start_date"].isoformat(), common["end_date"].isoformat()],
+        "departures": [[leg["airport"], leg["budget"]] for leg in common["departures"]],
+    }))
+
+def shortlist_request(interests: Dict[str, int], options: Optional[List[Dict[str, str]]] = None) -> str:
+    request: Dict[str, Any] = {"interests": interests}
+    if options:
+        request["options"] = options
+    return TOKENS.record_prompt("shortlist", _compact(request))
+
+def destination_request(city: str, iata: str, country: Optional[str]) -> str:
+    return TOKENS.record_prompt("destination", _compact({"city": city, "iata": iata, "country": country}))
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except ImportError:
+    _ENCODING = None
+
+def count_tokens(text: str) -> int:
+    """Tokens in `text` (tiktoken when installed, else the ~4 characters per token rule of thumb)."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+PREFIX_TOKENS = {
+    "plan": count_tokens(PLAN_INSTRUCTIONS),
+    "shortlist": count_tokens(SHORTLIST_INSTRUCTIONS),
+    "destination": count_tokens(DESTINATION_INSTRUCTIONS),
+}
+
+# which kind of prompt the OpenAI calls in the current task belong to
+PROMPT_KIND: ContextVar[str] = ContextVar("prompt_kind", default="other")
+
+@contextmanager
+def prompt_kind(kind: str):
+    """Attribute the OpenAI calls made inside the block to `kind`."""
+    token = PROMPT_KIND.set(kind)
+    try:
+        yield
+    finally:
+        PROMPT_KIND.reset(token)
+
+class TokenStats:
+    """
+    Per prompt kind: prompts built and their estimated variable-part tokens,
+    and the input (cached and uncached) and output tokens the API reported.
+    """
+
+    FIELDS = ("prompts", "request_tokens", "requests", "input_tokens", "cached_input_tokens", "output_tokens")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kinds: Dict[str, Dict[str, int]] = {}
+
+    def _add(self, kind: str, **counts: int):
+        with self._lock:
+            row = self._kinds.setdefault(kind, dict.fromkeys(self.FIELDS, 0))
+            for field, n in counts.items():
+                row[field] += n
+
+    def record_prompt(self, kind: str, text: str) -> str:
+        self._add(kind, prompts=1, request_tokens=count_tokens(text))
+        return text
+
+    def record_usage(self, kind: str, input_tokens: int, cached_input_tokens: int, output_tokens: int):
+        self._add(kind, requests=1, input_tokens=input_tokens,
+                  cached_input_tokens=cached_input_tokens, output_tokens=output_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for kind, row in self._kinds.items():
+                out[kind] = {
+                    **row,
+                    "prefix_tokens": PREFIX_TOKENS.get(kind),
+                    "cached_input_ratio": row["cached_input_tokens"] / row["input_tokens"] if row["input_tokens"] else 0.0,
+                }
+            return out
+
+TOKENS = TokenStats()
+
+def _usage(body: Dict[str, Any]):
+    usage = body.get("usage") or {}
+    if "input_tokens" in usage:
+        # Responses API (agent runs)
+        details = usage.get("input_tokens_details") or {}
+        return usage["input_tokens"], details.get("cached_tokens") or 0, usage.get("output_tokens") or 0
+    if "prompt_tokens" in usage:
+        # Chat Completions API
+        details = usage.get("prompt_tokens_details") or {}
+        return usage["prompt_tokens"], details.get("cached_tokens") or 0, usage.get("completion_tokens") or 0
+    return None
+
+async def _record_response(response: httpx.Response):
+    if response.is_error or not response.headers.get("content-type", "").startswith("application/json"):
+        return
+    try:
+        await response.aread()
+        counts = _usage(response.json())
+    except Exception as e:
+        print(f"Token accounting skipped: {e!r}")
+        return
+    if counts is not None:
+        TOKENS.record_usage(PROMPT_KIND.get(), *counts)
+
+def openai_client(api_key: Optional[str] = None, transport: Optional[httpx.AsyncBaseTransport] = None) -> AsyncOpenAI:
+    """
+    AsyncOpenAI whose responses are metered into TOKENS.
+
+    The SDK's own retries are off: it would retry a 429 itself, honouring
+    Retry-After, before the scheduler ever saw it. scheduler.OPENAI retries
+    instead: 429s pause every caller, 5xx and connection errors back off just
+    the failed request.
+    """
+    return AsyncOpenAI(
+        api_key=api_key,
+        max_retries=0,
+        http_client=DefaultAsyncHttpxClient(transport=transport, event_hooks={"response": [_record_response]}),
+    )
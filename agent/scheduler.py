@@ -0,0 +1,262 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+import httpx
+
+# lower runs first when callers queue for the same upstream
+PRIORITY_SHORTLIST = 0
+PRIORITY_PLAN = 1
+PRIORITY_BACKGROUND = 2
+
+# priority for calls that do not pass one; set it once in a task to cover everything it starts
+PRIORITY = contextvars.ContextVar("priority", default=PRIORITY_PLAN)
+
+SCHEDULER_MAX_RETRIES = int(os.environ.get("SCHEDULER_MAX_RETRIES", "4"))
+# retries of one call after a 5xx or a dropped / timed-out connection (the OpenAI SDK's own default is 2)
+SCHEDULER_MAX_ERROR_RETRIES = int(os.environ.get("SCHEDULER_MAX_ERROR_RETRIES", "2"))
+SCHEDULER_BASE_BACKOFF = float(os.environ.get("SCHEDULER_BASE_BACKOFF", "1"))
+SCHEDULER_MAX_BACKOFF = float(os.environ.get("SCHEDULER_MAX_BACKOFF", "30"))
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """
+    Seconds to wait before retrying if `exc` is an upstream rate limit (HTTP
+    429), else None. Works for httpx.HTTPStatusError and openai.APIStatusError,
+    which both carry the httpx response; 0 means "rate limited, no hint".
+    """
+    response = getattr(exc, "response", None)
+    if getattr(response, "status_code", None) != 429:
+        return None
+    header = response.headers.get("retry-after")
+    if not header:
+        return 0.0
+    try:
+        return max(float(header), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(header).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def transient(exc: BaseException) -> bool:
+    """
+    Whether `exc` is a failure worth retrying as is: an upstream 5xx, or a
+    connection error or timeout (httpx's own, or an OpenAI SDK error raised
+    from one).
+    """
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return status >= 500
+    return isinstance(exc, httpx.TransportError) or isinstance(exc.__cause__, httpx.TransportError)
+
+
+def _backoff(attempt: int) -> float:
+    return min(SCHEDULER_MAX_BACKOFF, SCHEDULER_BASE_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+class Upstream:
+    """
+    Process-wide admission control for one upstream API.
+
+    Calls are admitted in priority order (then FIFO) when both a token is
+    available in the `rate`/`burst` token bucket and fewer than `max_inflight`
+    calls are running. A call rejected with 429 pauses admission for the whole
+    upstream for its Retry-After (or an exponential backoff with jitter) before
+    being retried, so a burst slows every caller down instead of failing them
+    all. A 5xx or a dropped connection only concerns its own call, which backs
+    off and retries without holding anyone else back.
+
+    Like MCPSessionPool, the queue is bound to the event loop using it; if a
+    different loop takes over, the old waiters are forgotten.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_inflight: int,
+                 max_retries: int = SCHEDULER_MAX_RETRIES, max_error_retries: int = SCHEDULER_MAX_ERROR_RETRIES):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_inflight = max_inflight
+        self.max_retries = max_retries
+        self.max_error_retries = max_error_retries
+        self.calls = 0
+        self.throttled = 0
+        self.errors_retried = 0
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._inflight = 0
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._waiters = []
+            self._inflight = 0
+            self._timer = None
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        else:
+            self._tokens = float(self.burst)
+        self._refilled = now
+
+    def _dispatch(self):
+        self._timer = None
+        now = time.monotonic()
+        self._refill(now)
+        while self._waiters and self._inflight < self.max_inflight:
+            _, _, fut = self._waiters[0]
+            if fut.done():
+                # its caller was cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+            if now < self._paused_until:
+                wait = self._paused_until - now
+            elif self._tokens < 1:
+                wait = (1 - self._tokens) / self.rate
+            else:
+                heapq.heappop(self._waiters)
+                self._tokens -= 1
+                self._inflight += 1
+                fut.set_result(None)
+                continue
+            self._timer = self._loop.call_later(wait, self._dispatch)
+            return
+
+    def _kick(self):
+        if self._timer is None:
+            self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None):
+        """Wait for admission, then hold one in-flight slot for the body."""
+        self._bind_loop()
+        if priority is None:
+            priority = PRIORITY.get()
+        fut = self._loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        self._kick()
+        try:
+            await fut
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                # admitted just as we were cancelled; give the slot back
+                self._inflight -= 1
+                self._kick()
+            raise
+        try:
+            yield
+        finally:
+            self._inflight -= 1
+            self._kick()
+
+    def pause(self, seconds: float):
+        """Stop admitting calls for `seconds`."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def call(self, fn, *args, priority: Optional[int] = None, **kwargs) -> Any:
+        """Run `await fn(*args, **kwargs)` under admission control, retrying 429s and transient errors."""
+        throttles = errors = 0
+        while True:
+            delay = 0.0
+            async with self.slot(priority):
+                self.calls += 1
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception as e:
+                    wait = retry_after(e)
+                    if wait is not None and throttles < self.max_retries:
+                        self.throttled += 1
+                        wait = wait or _backoff(throttles)
+                        throttles += 1
+                        print(f"{self.name} rate limited; retrying in {wait:.1f}s")
+                        # pause before the slot is released so queued callers hold back too
+                        self.pause(wait)
+                    elif wait is None and transient(e) and errors < self.max_error_retries:
+                        self.errors_retried += 1
+                        delay = _backoff(errors)
+                        errors += 1
+                        print(f"{self.name} call failed ({e!r}); retrying in {delay:.1f}s")
+                    else:
+                        raise
+            # outside the slot, so other callers keep going meanwhile
+            if delay:
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "errors_retried": self.errors_retried,
+            "inflight": self._inflight,
+            "queued": len(self._waiters),
+            "paused_for": max(self._paused_until - time.monotonic(), 0.0),
+        }
+
+
+class RetryableResponse(Exception):
+    """A 429 or 5xx response, raised so Upstream.call retries it."""
+
+    def __init__(self, request: httpx.Request, response: httpx.Response):
+        super().__init__(f"HTTP {response.status_code} from {request.url}")
+        self.response = response
+
+
+class UpstreamTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that admits every request through `upstream`.
+
+    For clients whose requests are made by code we do not call directly (the
+    Agents SDK's model calls), so each HTTP request takes one token and one
+    in-flight slot, and a 429 pauses the whole upstream and retries just that
+    request (a 5xx or connection error retries it with its own backoff). Once
+    the retries run out the last response or error is handed to the client.
+    """
+
+    def __init__(self, upstream: Upstream, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.upstream = upstream
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        response = await self._transport.handle_async_request(request)
+        if response.status_code == 429 or response.status_code >= 500:
+            await response.aread()
+            raise RetryableResponse(request, response)
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            return await self.upstream.call(self._send, request)
+        except RetryableResponse as e:
+            return e.response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+OPENAI = Upstream(
+    "openai",
+    rate=float(os.environ.get("OPENAI_RATE_PER_SEC", "5")),
+    burst=int(os.environ.get("OPENAI_BURST", "10")),
+    max_inflight=int(os.environ.get("OPENAI_MAX_INFLIGHT", "8")),
+)
+SKYSCANNER = Upstream(
+    "skyscanner",
+    rate=float(os.environ.get("SKYSCANNER_RATE_PER_SEC", "10")),
+    burst=int(os.environ.get("SKYSCANNER_BURST", "20")),
+    max_inflight=int(os.environ.get("SKYSCANNER_MAX_INFLIGHT", "20")),
+)
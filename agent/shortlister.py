@@ -1,47 +1,109 @@
-import asyncio, json, os
-from typing import List, Dict, Any
+import asyncio, copy, json, os
+from collections import Counter
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
+import event_loop
+from scheduler import OPENAI, PRIORITY_SHORTLIST
+from ttl_cache import TTLCache, SQLiteStore
+from city_index import CITY_INDEX
+from prompts import SHORTLIST_INSTRUCTIONS, openai_client, prompt_kind, shortlist_request
 
 load_dotenv()
 API_KEY = os.getenv("OPENAI_API_KEY")
 if not API_KEY:
     raise RuntimeError("OPENAI_API_KEY missing in environment")
 
-SYSTEM_TMPL = """You are **Travel-Planner-AI**, an assistant helping a group
-choose European destinations.
+# "index": rank from the offline city index only (no LLM call)
+# "rerank": the LLM picks 4 from the index's top SHORTLIST_RERANK_POOL
+# "llm": the LLM proposes freely; its airports are still checked against the index
+SHORTLIST_MODE = os.getenv("SHORTLIST_MODE", "index")
+SHORTLIST_RERANK_POOL = int(os.getenv("SHORTLIST_RERANK_POOL", "10"))
+SHORTLIST_CACHE_TTL = float(os.getenv("SHORTLIST_CACHE_TTL", "86400"))
+SHORTLIST_CACHE_SIZE = int(os.getenv("SHORTLIST_CACHE_SIZE", "1024"))
+# "memory", "sqlite" (file at SHORTLIST_CACHE_PATH) or "mongo" (groupTrips.shortlistCache)
+SHORTLIST_CACHE_BACKEND = os.getenv("SHORTLIST_CACHE_BACKEND", "memory")
+SHORTLIST_CACHE_PATH = os.getenv("SHORTLIST_CACHE_PATH", "shortlist_cache.db")
 
-Task
-• Produce a ranked list of 4 European cities/towns that have airports.
+def canonical_interests(group_profiles: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    The group's interests as {interest: number of members who listed it},
+    case-folded and sorted, with duplicates inside one profile counted once.
+    """
+    counts = Counter(
+        interest
+        for profile in group_profiles
+        for interest in {i.strip().lower() for i in profile["interests"] if i.strip()}
+    )
+    return dict(sorted(counts.items()))
 
-Rules
-1. Cities must be in Europe and have an IATA airport code.
-2. Score ↑ when a city matches many of the group's interests.
-3. Return exactly 4 items, ranked by score (break ties alphabetically).
-4. Reply ONLY with minified JSON matching:
-
-{
-"candidates":[
-  {"city":"string","iata":"string","score":number,
-   "matched":["string"]}
-]}"""
+def _cache_store():
+    if SHORTLIST_CACHE_BACKEND == "sqlite":
+        return SQLiteStore(SHORTLIST_CACHE_PATH, table="shortlists")
+    if SHORTLIST_CACHE_BACKEND == "mongo":
+        from MongoDB.cache_store import MongoStore
+        return MongoStore("shortlistCache")
+    return None
 
 class ShortlisterClient:
-    def __init__(self, api_key: str = API_KEY, model: str = "gpt-4.1-2025-04-14"):
-        self.client = AsyncOpenAI(api_key=api_key)
+    def __init__(self, api_key: str = API_KEY, model: str = "gpt-4.1-2025-04-14", mode: str = SHORTLIST_MODE):
+        if mode not in ("index", "rerank", "llm"):
+            raise ValueError(f"Unknown shortlist mode {mode!r}")
+        self.client = openai_client(api_key)
         self.model = model
+        self.mode = mode
+        self.cache = TTLCache(maxsize=SHORTLIST_CACHE_SIZE, ttl=SHORTLIST_CACHE_TTL, store=_cache_store())
+
+    async def _cache_call(self, fn, *args):
+        # persistent backends do blocking I/O; keep it off the event loop
+        if self.cache.store is None:
+            return fn(*args)
+        try:
+            return await asyncio.to_thread(fn, *args)
+        except Exception as e:
+            print(f"Shortlist cache {fn.__name__} failed: {e}")
+            return None
 
     async def get_shortlist(self, group_profiles: List[Dict[str, Any]]) -> Dict[str, Any]:
-        user_block = json.dumps(group_profiles, separators=(',', ':'))
-        resp = await self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": SYSTEM_TMPL},
-                {"role": "user",   "content": user_block}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
+        interests = canonical_interests(group_profiles)
+        if self.mode == "index":
+            return CITY_INDEX.shortlist(interests)
+
+        key = f"{self.mode}:{self.model}:{json.dumps(interests, separators=(',', ':'))}"
+        cached = await self._cache_call(self.cache.get, key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        options = None
+        if self.mode == "rerank":
+            options = [
+                {"city": c["city"], "iata": c["iata"]}
+                for c in CITY_INDEX.rank(interests, SHORTLIST_RERANK_POOL)
+            ]
+        data = await self._ask_model(interests, options)
+        # catch bad airport codes here, before four agent runs are spent on them
+        data["candidates"] = CITY_INDEX.validate(data["candidates"], interests)
+        await self._cache_call(self.cache.set, key, data)
+        return copy.deepcopy(data)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+    async def _ask_model(self, interests: Dict[str, int], options: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+        # the model sees only the canonical form, so its answer is a function of the cache key
+        user_block = shortlist_request(interests, options)
+        # the shortlist gates every plan, so it jumps the queue ahead of agent runs
+        with prompt_kind("shortlist"):
+            resp = await OPENAI.call(
+                self.client.chat.completions.create,
+                priority=PRIORITY_SHORTLIST,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": SHORTLIST_INSTRUCTIONS},
+                    {"role": "user",   "content": user_block}
+                ],
+                temperature=0.7,
+                response_format={"type": "json_object"}
+            )
         
         data = self._parse(resp.choices[0].message.content)
         return data
@@ -63,7 +125,8 @@ class ShortlisterSync:
         self._inner = ShortlisterClient(*a, **kw)
 
     def get_shortlist(self, group_profiles):
-        return asyncio.run(self._inner.get_shortlist(group_profiles))
+        # runs on the shared loop so the AsyncOpenAI pool stays warm between calls
+        return event_loop.run(self._inner.get_shortlist(group_profiles))
 
 if __name__ == "__main__":
     sample_group = [
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import OperationFailure
+from MongoDB.data_retrieve import get_pending_trips, claim_trip, set_trip_status, watch_new_trips
+from scheduler import PRIORITY, PRIORITY_BACKGROUND
+
+# trips pre-planned at once
+WATCH_CONCURRENCY = int(os.environ.get("WATCH_CONCURRENCY", "2"))
+# polling interval when change streams are unavailable (standalone Mongo)
+WATCH_POLL_SECONDS = float(os.environ.get("WATCH_POLL_SECONDS", "10"))
+# on start, also pre-plan pending trips created this many hours before; older
+# groupTrips documents (every trip from before the watcher existed) are left alone
+WATCH_BACKLOG_HOURS = float(os.environ.get("WATCH_BACKLOG_HOURS", "0"))
+
+async def preplan(request):
+    """
+    Plan a newly inserted trip so its /plan-trip call is a plan cache hit.
+
+    The trip is claimed first (pending -> planning), so several watchers, or a
+    poll racing the change stream, never plan the same trip twice.
+    """
+    import planner
+
+    trip_id = request["trip_id"]
+    if not await asyncio.to_thread(claim_trip, trip_id):
+        return
+    try:
+        result = await planner.plan_trip(planner.validate_basics(request))
+    except Exception:
+        traceback.print_exc()
+        await asyncio.to_thread(set_trip_status, trip_id, "failed")
+        return
+    # a result with dropped candidates is not cached, so /plan-trip will recompute it
+    status = "planned" if planner.cacheable(result) else "partial"
+    await asyncio.to_thread(set_trip_status, trip_id, status)
+    print(f"Pre-planned trip {trip_id} ({status}): {len(result['plans'])} plan(s), {len(result['dropped'])} dropped")
+
+def _follow(loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+    # blocking change-stream reader; runs on its own daemon thread
+    try:
+        for request in watch_new_trips():
+            loop.call_soon_threadsafe(queue.put_nowait, request)
+    except OperationFailure as e:
+        print(f"Change streams unavailable ({e}); falling back to polling")
+        loop.call_soon_threadsafe(queue.put_nowait, None)
+    except Exception:
+        # anything else would end the thread silently; polling keeps trips being pre-planned
+        traceback.print_exc()
+        print("Change stream failed; falling back to polling")
+        loop.call_soon_threadsafe(queue.put_nowait, None)
+
+async def _poll(queue: asyncio.Queue, poll_seconds: float, since: datetime):
+    while True:
+        await asyncio.sleep(poll_seconds)
+        try:
+            pending = await asyncio.to_thread(get_pending_trips, since=since)
+        except Exception as e:
+            # e.g. a Mongo failover; try again next round
+            print(f"Polling for pending trips failed: {e!r}")
+            continue
+        for request in pending:
+            queue.put_nowait(request)
+
+async def watch(concurrency: int = WATCH_CONCURRENCY, poll_seconds: float = WATCH_POLL_SECONDS,
+                backlog_hours: float = WATCH_BACKLOG_HOURS):
+    """Pre-plan pending trips from the last `backlog_hours`, then every newly inserted one, until cancelled."""
+    from agent_helpers import close_pools
+
+    # interactive /plan-trip calls go ahead of pre-planning at the rate limiter
+    PRIORITY.set(PRIORITY_BACKGROUND)
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    limit = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def _run(request):
+        async with limit:
+            await preplan(request)
+
+    # trips inserted while the watcher was down, within the backlog window
+    since = datetime.now(timezone.utc) - timedelta(hours=backlog_hours)
+    for request in await asyncio.to_thread(get_pending_trips, since=since):
+        queue.put_nowait(request)
+    threading.Thread(target=_follow, args=(loop, queue), name="trip-watcher", daemon=True).start()
+
+    try:
+        while True:
+            request = await queue.get()
+            if request is None:
+                tasks.add(asyncio.ensure_future(_poll(queue, poll_seconds, since)))
+                continue
+            task = asyncio.ensure_future(_run(request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await close_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-plan trips as they are inserted into groupTrips")
+    parser.add_argument("--concurrency", type=int, default=WATCH_CONCURRENCY)
+    parser.add_argument("--poll-seconds", type=float, default=WATCH_POLL_SECONDS)
+    parser.add_argument("--backlog-hours", type=float, default=WATCH_BACKLOG_HOURS,
+                        help="on start, also pre-plan pending trips created up to this many hours ago")
+    args = parser.parse_args()
+    try:
+        asyncio.run(watch(args.concurrency, args.poll_seconds, args.backlog_hours))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import traceback
+from MongoDB import job_queue
+
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", "2"))
+# jobs planned at once by each worker process
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", "4"))
+WORKER_POLL_SECONDS = float(os.environ.get("WORKER_POLL_SECONDS", "1"))
+
+async def _run_job(job):
+    # imported here so the parent process does not open clients it never uses
+    import planner
+
+    data = planner.validate_basics(dict(job["request"]))
+    seen = []
+    async for ev in planner.cached_plan_events(data, job["refresh"]):
+        seen.append(ev)
+        # persist each stage as it lands so GET /jobs/<id> shows partial results
+        await asyncio.to_thread(job_queue.add_event, job["_id"], ev)
+    await asyncio.to_thread(job_queue.finish, job["_id"], planner.assemble(seen))
+
+async def _drain(worker: str):
+    while True:
+        job = await asyncio.to_thread(job_queue.claim, worker)
+        if job is None:
+            await asyncio.sleep(WORKER_POLL_SECONDS)
+            continue
+        print(f"[{worker}] job {job['_id']} started (attempt {job['attempts']})")
+        try:
+            await _run_job(job)
+        except Exception as e:
+            traceback.print_exc()
+            await asyncio.to_thread(job_queue.fail, job["_id"], str(e))
+        else:
+            print(f"[{worker}] job {job['_id']} done")
+
+async def _reap():
+    while True:
+        requeued = await asyncio.to_thread(job_queue.requeue_stale)
+        if requeued:
+            print(f"Requeued {requeued} stale job(s)")
+        await asyncio.sleep(job_queue.JOB_STALE_SECONDS / 2)
+
+async def serve(concurrency: int = WORKER_CONCURRENCY):
+    """Drain the job queue with `concurrency` jobs in flight until cancelled."""
+    from agent_helpers import close_pools
+
+    worker = job_queue.worker_id()
+    try:
+        await asyncio.gather(_reap(), *(_drain(worker) for _ in range(concurrency)))
+    finally:
+        await close_pools()
+
+def _process_main(concurrency: int):
+    try:
+        asyncio.run(serve(concurrency))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run trip-planning workers for /plan-trip?async=1 jobs")
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES)
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _process_main(args.concurrency)
+    else:
+        procs = [
+            multiprocessing.Process(target=_process_main, args=(args.concurrency,), name=f"planner-{i}")
+            for i in range(args.processes)
+        ]
+        for p in procs:
+            p.start()
+        try:
+            for p in procs:
+                p.join()
+        except KeyboardInterrupt:
+            for p in procs:
+                p.join()